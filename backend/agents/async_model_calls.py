@@ -1,36 +1,119 @@
 """
-    异步封装大模型的同步stream返回，以支持异步并行多智能体调用
+    基于原生异步客户端的大模型流式调用，以支持异步并行多智能体调用
+    客户端由 agents.providers 在应用启动时统一创建、跨请求共享连接池，流式读取不再占用线程
+    设置 LLM_FAKE_PROVIDERS 时相应供应商由离线替身（agents.fake_provider）回放录制或合成的事件序列
 """
 import asyncio
-import threading
-import os
 import json
-from typing import Any, AsyncGenerator, Dict, Optional
-from volcenginesdkarkruntime import Ark
-from dotenv import load_dotenv
-from openai import OpenAI
-from openai.types.chat import ChatCompletionChunk
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, List, Optional
 from fastapi import Request
 
-load_dotenv()  # 加载环境变量
+from agents.fake_provider import fake_enabled, provider_events
+from agents.providers import get_client
+from utilities.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 合流公平性：每个节点每轮最多连续输出的事件数
+MERGE_QUANTUM = int(os.getenv("AGENT_MERGE_QUANTUM", "8"))
+
+
+async def _iter_with_timeout(create_stream, timeout: Optional[float]) -> AsyncGenerator[Any, None]:
+    """
+    逐事件读取异步流，单个事件等待超过 timeout 秒时输出超时错误并关闭流
+    :param create_stream: 返回异步流对象的协程（建立连接同样计入超时）
+    """
+    try:
+        stream = await asyncio.wait_for(create_stream, timeout=timeout)
+    except asyncio.TimeoutError:
+        yield {"event": "error", "message": "stream timeout"}
+        return
+    except Exception as e:
+        yield {"event": "error", "message": str(e)}
+        return
+
+    iterator: AsyncIterator = stream.__aiter__()
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(iterator.__anext__(), timeout=timeout)
+            except StopAsyncIteration:
+                break
+            except asyncio.TimeoutError:
+                yield {"event": "error", "message": "stream timeout"}
+                break
+            except Exception as e:
+                yield {"event": "error", "message": str(e)}
+                break
+            yield item
+    finally:
+        await stream.close()  # 提前结束（超时、客户端断开）时释放连接回连接池
+
+
+# 节点流式输出指标，标签：供应商、节点
+_LABELS = ("provider", "node")
+TTFT_SECONDS = metrics.histogram("llm_time_to_first_token_seconds", "首个增量（思考或输出）到达耗时", _LABELS)
+TOKENS_PER_SECOND = metrics.histogram("llm_tokens_per_second", "首个增量之后的增量输出速率（增量事件数/秒）", _LABELS,
+                                      buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500))
+STREAM_SECONDS = metrics.histogram("llm_stream_duration_seconds", "单次流式输出总耗时", _LABELS)
+STREAMS_TOTAL = metrics.counter("llm_streams_total", "流式输出次数，status 为 ok / error / cancelled", _LABELS + ("status",))
+ERRORS_TOTAL = metrics.counter("llm_stream_errors_total", "流式输出中的错误事件数", _LABELS)
+TIMEOUTS_TOTAL = metrics.counter("llm_stream_timeouts_total", "流式输出超时次数", _LABELS)
+
+_DELTA_PHASES = ("thinking", "output")
+
+
+async def track_stream(provider: str, node: str, events: AsyncIterator[Dict[str, Any]]
+                       ) -> AsyncGenerator[Dict[str, Any], None]:
+    """透传解析后的事件流，记录首个增量耗时、增量速率、总耗时、错误与超时"""
+    started = time.perf_counter()
+    first_at: Optional[float] = None
+    deltas = 0
+    errors = 0
+    status = "cancelled"
+    try:
+        async for event in events:
+            phase = event.get("phase")
+            if phase in _DELTA_PHASES:
+                if first_at is None:
+                    first_at = time.perf_counter()
+                    TTFT_SECONDS.observe(provider, node, value=first_at - started)
+                deltas += 1
+            elif phase == "error":
+                errors += 1
+                ERRORS_TOTAL.inc(provider, node)
+                if event.get("content") == "stream timeout":
+                    TIMEOUTS_TOTAL.inc(provider, node)
+            yield event
+        status = "error" if errors else "ok"
+    finally:
+        ended = time.perf_counter()
+        STREAM_SECONDS.observe(provider, node, value=ended - started)
+        STREAMS_TOTAL.inc(provider, node, status)
+        if first_at is not None and deltas > 1 and ended > first_at:
+            TOKENS_PER_SECOND.observe(provider, node, value=(deltas - 1) / (ended - first_at))
 
 
 class DoubaoAsyncStreamer:
     """
-    将豆包（火山Ark）的同步流封装为异步流式输出。
+    豆包（火山Ark）异步流式输出。
     可直接在 FastAPI 或 LangGraph 中使用。
 
     用法示例：
-        streamer = DoubaoAsyncStreamer(api_key="sk-xxx")
+        streamer = DoubaoAsyncStreamer()
         async for event in streamer.stream(params):
             yield event
     """
+    provider = "doubao"
+    requests_per_stream = 1
 
     def __init__(self):
-        self.client = Ark(
-            base_url='https://ark.cn-beijing.volces.com/api/v3',
-            api_key=os.getenv("ARK_API_KEY")
-        )
+        # 启用离线替身时不创建供应商客户端
+        self.client = None if fake_enabled(self.provider) else get_client(self.provider)
 
     async def stream(self, create_params: Dict[str, Any],
                      timeout: Optional[float] = 60.0) -> AsyncGenerator[Dict[str, Any], None]:
@@ -38,40 +121,15 @@ class DoubaoAsyncStreamer:
         异步生成器：实时yield豆包事件
         :create_params: {"model": model_id, "input": messages, "stream": True, "tools": ["type" : "web_search", "limit": 15]}
         """
-        queue: asyncio.Queue = asyncio.Queue()
-        loop = asyncio.get_running_loop()
-        done_flag = threading.Event()
+        async for item in _iter_with_timeout(self.client.responses.create(**create_params), timeout):
+            yield item
 
-        def _blocking_stream():
-            """在后台线程运行豆包同步流"""
-            try:
-                with self.client.responses.create(**create_params) as stream: # type: ignore
-                    for event in stream:
-                        asyncio.run_coroutine_threadsafe(queue.put(event), loop)
-                asyncio.run_coroutine_threadsafe(queue.put({"event": "done"}), loop)
-            except Exception as e:
-                asyncio.run_coroutine_threadsafe(queue.put({"event": "error", "message": str(e)}), loop)
-            finally:
-                done_flag.set()  # 标记线程完成
-
-        thread = threading.Thread(target=_blocking_stream, daemon=True)
-        thread.start()
-
-        # 异步消费队列
-        while not done_flag.is_set() or not queue.empty():
-            try:
-                item = await asyncio.wait_for(queue.get(), timeout=timeout)
-                if isinstance(item, dict) and item.get("event") == "done":
-                    break
-                yield item
-            except asyncio.TimeoutError:
-                yield {"event": "error", "message": "stream timeout"}
-                break
-
-        thread.join(timeout=0.1)
+    async def streaming_out(self, create_params: Dict[str, Any], node: str = ""):
+        """解析豆包原始流式输出结果，按供应商、节点记录耗时指标"""
+        async for event in track_stream(self.provider, node, provider_events(self, create_params, node)):
+            yield event
 
-    async def streaming_out(self, create_params: Dict[str, Any]):
-        """解析豆包原始流式输出结果"""
+    async def _parse_events(self, create_params: Dict[str, Any]):
 
         streamer = self.stream(create_params)
         steps = 0
@@ -116,21 +174,24 @@ class DoubaoAsyncStreamer:
 
 class KimiAsyncStreamer:
     """
-    将KIMI的同步流封装为异步流式输出。
+    KIMI异步流式输出。
     可直接在 FastAPI 或 LangGraph 中使用。
 
     用法示例：
-        streamer = DoubaoAsyncStreamer(api_key="sk-xxx")
+        streamer = KimiAsyncStreamer()
         async for event in streamer.stream(params):
             yield event
     """
+    provider = "kimi"
+    requests_per_stream = 2  # 先非流式检索，再流式输出
 
     def __init__(self):
-        self.client = OpenAI(base_url="https://api.moonshot.cn/v1", api_key=os.getenv("KIMI_API_KEY"))
+        # 启用离线替身时不创建供应商客户端
+        self.client = None if fake_enabled(self.provider) else get_client(self.provider)
 
-    def kimi_model_call(self, create_params: Dict[str, Any]):
+    async def kimi_model_call(self, create_params: Dict[str, Any]):
         # noinspection PyTypeChecker
-        resp = self.client.chat.completions.create(**create_params)
+        resp = await self.client.chat.completions.create(**create_params)
         return resp.choices[0]
 
     def search_impl(self, arguments: Dict[str, Any]) -> Any:
@@ -146,68 +207,53 @@ class KimiAsyncStreamer:
         异步生成器：实时yield KIMI事件 :create_params: {"model": model_id, "messages": messages, "stream": True,
         "tools": ["type" : "builtin_function", "function": {"name": "$web_search"}]}
         """
-        queue: asyncio.Queue = asyncio.Queue()
-        loop = asyncio.get_running_loop()
-        done_flag = threading.Event()
-
-        def _blocking_stream():
-            # 在后台运行KIMI同步流
-            _messages = create_params['messages']
-            try:
-                create_params['stream'] = False
-                resp = self.kimi_model_call(create_params)  # 首先使用同步函数获取检索结果
-                if resp.finish_reason == "tool_calls":
-                    _messages.append(resp.message)
-                    _choice = resp
-                    for tool_call in _choice.message.tool_calls:
-                        tool_call_id = tool_call.id
-                        tool_call_name = tool_call.function.name
-                        tool_call_arguments = json.loads(tool_call.function.arguments)
-
-                        if tool_call_name == "$web_search":
-                            tool_result = self.search_impl(tool_call_arguments)
-                        else:
-                            tool_result = f"Error: unknown tool '{tool_call_name}'"
-
-                        # 把联网结果添加至上下文
-                        _messages.append({
-                            "role": "tool",
-                            "tool_call_id": tool_call_id,
-                            "name": tool_call_name,
-                            "content": json.dumps(tool_result),
-                        })
-                    create_params['stream'] = True
-                    create_params['messages'] = _messages
-                    print("KIMI....检索完成")
-                # 将一轮检索结果，返回给大模型进行流式输出
-                with self.client.chat.completions.create(**create_params) as stream:
-                    for event in stream:
-                        asyncio.run_coroutine_threadsafe(queue.put(event), loop)
-                asyncio.run_coroutine_threadsafe(queue.put({"event": "done"}), loop)
-            except Exception as e:
-                asyncio.run_coroutine_threadsafe(queue.put({"event": "error", "message": str(e)}), loop)
-            finally:
-                done_flag.set()  # 标记线程完成
+        _messages = create_params['messages']
+        try:
+            create_params['stream'] = False
+            # 首先以非流式调用获取检索结果，与流式读取共用超时
+            resp = await asyncio.wait_for(self.kimi_model_call(create_params), timeout=timeout)
+            if resp.finish_reason == "tool_calls":
+                _messages.append(resp.message)
+                _choice = resp
+                for tool_call in _choice.message.tool_calls:
+                    tool_call_id = tool_call.id
+                    tool_call_name = tool_call.function.name
+                    tool_call_arguments = json.loads(tool_call.function.arguments)
+
+                    if tool_call_name == "$web_search":
+                        tool_result = self.search_impl(tool_call_arguments)
+                    else:
+                        tool_result = f"Error: unknown tool '{tool_call_name}'"
+
+                    # 把联网结果添加至上下文
+                    _messages.append({
+                        "role": "tool",
+                        "tool_call_id": tool_call_id,
+                        "name": tool_call_name,
+                        "content": json.dumps(tool_result),
+                    })
+                logger.debug(f"KIMI 联网检索完成，共 {len(_messages)} 条上下文消息")
+            create_params['stream'] = True
+            create_params['messages'] = _messages
+        except asyncio.TimeoutError:
+            yield {"event": "error", "message": "stream timeout"}
+            return
+        except Exception as e:
+            yield {"event": "error", "message": str(e)}
+            return
 
-        thread = threading.Thread(target=_blocking_stream, daemon=True)
-        thread.start()
+        # 将一轮检索结果，返回给大模型进行流式输出
+        async for item in _iter_with_timeout(self.client.chat.completions.create(**create_params), timeout):
+            yield item
 
-        # 异步消费队列
-        while not done_flag.is_set() or not queue.empty():
-            try:
-                item = await asyncio.wait_for(queue.get(), timeout=timeout)
-                if isinstance(item, dict) and item.get("event") == "done":
-                    break
-                yield item
-
-            except asyncio.TimeoutError:
-                yield {"event": "error", "message": "stream timeout"}
-                break
+    async def streaming_out(self, create_params: Dict[str, Any], node: str = ""):
+        """解析KIMI原始流式输出结果，按供应商、节点记录耗时指标"""
+        async for event in track_stream(self.provider, node, provider_events(self, create_params, node)):
+            yield event
 
-        thread.join(timeout=0.1)
+    async def _parse_events(self, create_params: Dict[str, Any]):
+        from openai.types.chat import ChatCompletionChunk  # 客户端创建时SDK已导入
 
-    async def streaming_out(self, create_params: Dict[str, Any]):
-        """解析KIMI原始流式输出结果"""
         streamer = self.stream(create_params)
         step = 0
         async for event in streamer:
@@ -237,58 +283,37 @@ class KimiAsyncStreamer:
 
 class GPTAsyncStreamer:
     """
-    将GPT5的同步流封装为异步流式输出。
+    GPT5异步流式输出。
     可直接在 FastAPI 或 LangGraph 中使用。
 
     用法示例：
-        streamer = DoubaoAsyncStreamer(api_key="sk-xxx")
+        streamer = GPTAsyncStreamer()
         async for event in streamer.stream(params):
             yield event
     """
+    provider = "gpt"
+    requests_per_stream = 1
+
     def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("AIONLY_API_KEY"), base_url="https://api.aiionly.com/v1")
+        # 启用离线替身时不创建供应商客户端
+        self.client = None if fake_enabled(self.provider) else get_client(self.provider)
 
     async def stream(self, create_params: Dict[str, Any],
                      timeout: Optional[float] = 180.0) -> AsyncGenerator[Dict[str, Any], None]:
         """
-        异步生成器：实时yield豆包事件
+        异步生成器：实时yield GPT事件
         :create_params: {"model": model_id, "input": messages, "stream": True, "reasoning": {"effort": "medium"}}
         """
-        queue: asyncio.Queue = asyncio.Queue()
-        loop = asyncio.get_running_loop()
-        done_flag = threading.Event()
-
-        def _blocking_stream():
-            """在后台线程运行GPT同步流"""
-            try:
-                with self.client.responses.create(**create_params) as stream:
-                    print(f"GPT5请求开始，请求参数{create_params}")
-                    for event in stream:
-                        asyncio.run_coroutine_threadsafe(queue.put(event), loop)
-                asyncio.run_coroutine_threadsafe(queue.put({"event": "done"}), loop)
-            except Exception as e:
-                asyncio.run_coroutine_threadsafe(queue.put({"event": "error", "message": str(e)}), loop)
-            finally:
-                done_flag.set()  # 标记线程完成
-
-        thread = threading.Thread(target=_blocking_stream, daemon=True)
-        thread.start()
-
-        # 异步消费队列
-        while not done_flag.is_set() or not queue.empty():
-            try:
-                item = await asyncio.wait_for(queue.get(), timeout=timeout)
-                if isinstance(item, dict) and item.get("event") == "done":
-                    break
-                yield item
-            except asyncio.TimeoutError:
-                yield {"event": "error", "message": "stream timeout"}
-                break
+        logger.debug(f"GPT5请求开始，模型 {create_params.get('model')}，输入 {len(create_params.get('input') or [])} 条消息")
+        async for item in _iter_with_timeout(self.client.responses.create(**create_params), timeout):
+            yield item
 
-        thread.join(timeout=0.1)
+    async def streaming_out(self, create_params: Dict[str, Any], node: str = ""):
+        """解析GPT5原始流式输出结果，按供应商、节点记录耗时指标"""
+        async for event in track_stream(self.provider, node, provider_events(self, create_params, node)):
+            yield event
 
-    async def streaming_out(self, create_params: Dict[str, Any]):
-        """解析GPT5原始流式输出结果"""
+    async def _parse_events(self, create_params: Dict[str, Any]):
         streamer = self.stream(create_params)
         step = 0
         model = ''
@@ -317,12 +342,80 @@ class GPTAsyncStreamer:
                 yield {"phase": "error", "content": f"错误信息：{e}", "annotation": {}, "model": model, "id": response_id}
 
 
+class FairQueue:
+    """
+    多节点公平合流队列：每个节点一个缓冲区，按赤字轮询（每轮每个节点最多取 quantum 条）出队，
+    输出频繁的节点无法饿死其他节点；同一节点内保持先后顺序。接口与 asyncio.Queue 的 put/get 一致。
+    """
+
+    def __init__(self, quantum: int = MERGE_QUANTUM, weights: Optional[Dict[str, int]] = None):
+        """
+        :param quantum: 每个节点每轮最多连续输出的事件数
+        :param weights: 节点权重，实际配额为 quantum * weight
+        """
+        self.quantum = max(1, quantum)
+        self.weights = weights or {}
+        self._buffers: Dict[str, deque] = {}
+        self._order: List[str] = []
+        self._urgent: deque = deque()  # 控制消息（如客户端断开）优先出队
+        self._cursor = 0
+        self._served = 0
+        self._size = 0
+        self._ready = asyncio.Event()
+
+    def qsize(self) -> int:
+        return self._size + len(self._urgent)
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
+    def put_nowait(self, item: Dict[str, Any]):
+        node = item.get("node", "")
+        buffer = self._buffers.get(node)
+        if buffer is None:
+            buffer = self._buffers[node] = deque()
+            self._order.append(node)
+        buffer.append(item)
+        self._size += 1
+        self._ready.set()
+
+    async def put(self, item: Dict[str, Any]):
+        self.put_nowait(item)
+
+    def interrupt(self, item: Dict[str, Any]):
+        """插入控制消息，下一次 get 立即返回"""
+        self._urgent.append(item)
+        self._ready.set()
+
+    async def get(self) -> Dict[str, Any]:
+        while self.empty():
+            self._ready.clear()
+            await self._ready.wait()
+        if self._urgent:
+            return self._urgent.popleft()
+        return self._next()
+
+    def _next(self) -> Dict[str, Any]:
+        node = self._order[self._cursor]
+        if not self._buffers[node] or self._served >= self.quantum * self.weights.get(node, 1):
+            # 当前节点配额用尽或无数据，轮转到下一个有数据的节点
+            for step in range(1, len(self._order) + 1):
+                cursor = (self._cursor + step) % len(self._order)
+                if self._buffers[self._order[cursor]]:
+                    break
+            self._cursor, self._served = cursor, 0
+            node = self._order[cursor]
+        self._served += 1
+        self._size -= 1
+        return self._buffers[node].popleft()
+
+
 class MultiAgents:
     """并行接收、拼流基类"""
     def __init__(self):
         pass
 
-    async def reader_task(self, task_name: str, stream, queue: asyncio.Queue):
+    async def reader_task(self, task_name: str, stream, queue):
         """从单个节点读数据放入队列"""
         try:
             async for chunk in stream:
@@ -331,20 +424,37 @@ class MultiAgents:
         except Exception as e:
             await queue.put({"type": "error", "node": task_name, "error": str(e)})
 
-    async def merge_stream(self, request: Request, queue: asyncio.Queue, nodes_total: int):
-        ended = set()
+    @staticmethod
+    async def watch_disconnect(request: Request, queue):
+        """等待客户端断开（不轮询），断开后向队列插入控制消息唤醒合流循环"""
         while True:
-            if await request.is_disconnected():
-                print("Client disconnected")
-                break
-            item = await queue.get()
-            if item["type"] == "data":
-                yield item["text"]
-            elif item["type"] == "end":
-                ended.add(item["node"])
-                if len(ended) == nodes_total:
-                    break
-            elif item["type"] == "error":
-                print(f"Error from node {item['node']}: {item['error']}")
+            message = await request.receive()
+            if message["type"] == "http.disconnect":
+                queue.interrupt({"type": "disconnect", "node": ""})
+                return
 
-            await asyncio.sleep(0.01)  # 每秒最多 100 条事件
+    async def merge_stream(self, request: Optional[Request], queue, nodes_total: int):
+        """
+        合并多个节点的输出：阻塞等待队列，有数据立即输出，不做固定间隔休眠
+        :param request: 客户端请求，传入时客户端断开即停止合流；由后台流水线调用时为None
+        :param queue: FairQueue，各节点按配额轮询出队
+        """
+        ended = set()
+        watcher = asyncio.create_task(self.watch_disconnect(request, queue)) if request is not None else None
+        try:
+            while True:
+                item = await queue.get()
+                if item["type"] == "data":
+                    yield item["text"]
+                elif item["type"] == "end":
+                    ended.add(item["node"])
+                    if len(ended) == nodes_total:
+                        break
+                elif item["type"] == "error":
+                    logger.error(f"节点 {item['node']} 出错：{item['error']}")
+                elif item["type"] == "disconnect":
+                    logger.info("客户端已断开")
+                    break
+        finally:
+            if watcher is not None:
+                watcher.cancel()
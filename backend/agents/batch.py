@@ -0,0 +1,173 @@
+"""
+    批量研究任务：对一组股票（策略组合或代码列表）按有界并发逐只运行研究流水线，
+    任务进度通过状态流（SSE）推送；并发由全局槽位与单任务上限共同限制
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 全部批量任务共享的最大并发流水线数，避免批量任务挤占交互式研究
+BATCH_MAX_CONCURRENCY = int(os.getenv("AGENT_BATCH_MAX_CONCURRENCY", "4"))
+# 单个任务默认并发数
+BATCH_DEFAULT_CONCURRENCY = int(os.getenv("AGENT_BATCH_CONCURRENCY", "2"))
+# 保留的已结束任务数
+BATCH_HISTORY_SIZE = 50
+
+PENDING, RUNNING, DONE, SKIPPED, FAILED, CANCELLED = "pending", "running", "done", "skipped", "failed", "cancelled"
+
+_slots: Optional[asyncio.Semaphore] = None
+
+
+def _global_slots() -> asyncio.Semaphore:
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+    return _slots
+
+
+class BatchJob:
+    """批量研究任务"""
+
+    def __init__(self, items: List[Dict[str, Any]], report_date, concurrency: int,
+                 run_one: Callable[[Dict[str, Any]], Awaitable[str]], source: str = ""):
+        """
+        :param items: [{"code", "shortName", "userInput"}]
+        :param run_one: 单只股票研究函数，返回 done / skipped
+        """
+        self.id = uuid.uuid4().hex[:12]
+        self.source = source
+        self.report_date = report_date
+        self.concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY))
+        self.items = [{**item, "status": PENDING, "error": None, "startedAt": None, "finishedAt": None}
+                      for item in items]
+        self.status = PENDING
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.version = 0
+        self._run_one = run_one
+        self._wakeup: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # ---------------- 状态 ----------------
+    def counts(self) -> Dict[str, int]:
+        counts = {s: 0 for s in (PENDING, RUNNING, DONE, SKIPPED, FAILED, CANCELLED)}
+        for item in self.items:
+            counts[item["status"]] += 1
+        return counts
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "jobId": self.id,
+            "source": self.source,
+            "reportDate": str(self.report_date),
+            "status": self.status,
+            "concurrency": self.concurrency,
+            "total": len(self.items),
+            "counts": self.counts(),
+            "createdAt": self.created_at,
+            "finishedAt": self.finished_at,
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.summary(), "items": self.items}
+
+    def _changed(self):
+        self.version += 1
+        if self._wakeup is not None:
+            if not self._wakeup.done():
+                self._wakeup.set_result(None)
+            self._wakeup = None
+
+    async def wait_change(self, version: int):
+        """等待任务状态在 version 之后发生变化"""
+        while self.version == version and self.status not in (DONE, CANCELLED):
+            if self._wakeup is None:
+                self._wakeup = asyncio.get_running_loop().create_future()
+            # 同一 future 由全部订阅者共享，shield 使单个订阅者断开时不取消其他订阅者的等待
+            await asyncio.shield(self._wakeup)
+
+    # ---------------- 执行 ----------------
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def cancel(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _run(self):
+        self.status = RUNNING
+        self._changed()
+        job_slots = asyncio.Semaphore(self.concurrency)
+        try:
+            await asyncio.gather(*(self._run_item(item, job_slots) for item in self.items))
+            self.status = DONE
+        except asyncio.CancelledError:
+            for item in self.items:
+                if item["status"] in (PENDING, RUNNING):
+                    item["status"] = CANCELLED
+            self.status = CANCELLED
+        finally:
+            self.finished_at = time.time()
+            self._changed()
+            logger.info(f"批量研究任务 {self.id} 结束：{self.counts()}")
+
+    async def _run_item(self, item: Dict[str, Any], job_slots: asyncio.Semaphore):
+        async with job_slots, _global_slots():
+            item["status"] = RUNNING
+            item["startedAt"] = time.time()
+            self._changed()
+            try:
+                item["status"] = await self._run_one(item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"批量研究 {item['code']} 失败：{e}")
+                item["status"] = FAILED
+                item["error"] = str(e)
+            item["finishedAt"] = time.time()
+            self._changed()
+
+    async def status_stream(self) -> AsyncIterator[Dict[str, Any]]:
+        """任务状态流：首条为完整快照，之后每次变化推送进度摘要及变化条目，任务结束后返回"""
+        version = self.version
+        yield {"type": "snapshot", "job": self.snapshot()}
+        seen = {item["code"]: (item["status"], item["error"]) for item in self.items}
+        while self.status not in (DONE, CANCELLED):
+            await self.wait_change(version)
+            version = self.version
+            changed = [item for item in self.items if seen.get(item["code"]) != (item["status"], item["error"])]
+            for item in changed:
+                seen[item["code"]] = (item["status"], item["error"])
+            if changed:
+                yield {"type": "progress", "job": self.summary(), "items": changed}
+        yield {"type": "finished", "job": self.summary()}
+
+
+class BatchRegistry:
+    """批量任务注册表，保留运行中及最近结束的任务"""
+
+    def __init__(self):
+        self._jobs: "OrderedDict[str, BatchJob]" = OrderedDict()
+
+    def submit(self, job: BatchJob) -> BatchJob:
+        self._jobs[job.id] = job
+        job.start()
+        finished = [job_id for job_id, j in self._jobs.items() if j.status in (DONE, CANCELLED)]
+        for job_id in finished[:max(0, len(finished) - BATCH_HISTORY_SIZE)]:
+            del self._jobs[job_id]
+        return job
+
+    def get(self, job_id: str) -> Optional[BatchJob]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [job.summary() for job in self._jobs.values()]
+
+
+batch_jobs = BatchRegistry()
@@ -0,0 +1,110 @@
+"""
+    智能体节点级检查点：每个节点正常完成后异步写入（不阻塞事件流），
+    同一股票、报告期的后续请求复用已完成节点，只重新生成缺失节点
+    表结构见 databases/migrations/002_agent_node_checkpoints.sql
+"""
+import asyncio
+import datetime
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Set, Tuple
+
+import asyncpg
+
+from utilities.basic_funcs import bare_code
+
+logger = logging.getLogger(__name__)
+
+# 后台写入任务的强引用，避免未完成即被回收
+_pending_writes: Set[asyncio.Task] = set()
+
+
+async def save_node_checkpoint(pool: asyncpg.Pool, stock_code: str, report_date: datetime.date, business_type: int,
+                               node: str, content: str, thinking: str = ""):
+    """写入（覆盖）单个节点的检查点"""
+    try:
+        await pool.execute(
+            """
+            INSERT INTO ai_agents.fundamental_node_checkpoints
+                (stock_code, report_date, business_type, node, content, thinking)
+            VALUES ($1, $2, $3, $4, $5, $6)
+            ON CONFLICT (stock_code, report_date, business_type, node)
+            DO UPDATE SET content = EXCLUDED.content, thinking = EXCLUDED.thinking, created_at = now()
+            """,
+            bare_code(stock_code), report_date, business_type, node, content, thinking
+        )
+        logger.info(f"{bare_code(stock_code)} {node} 节点检查点已保存")
+    except Exception as e:
+        logger.exception(f"{bare_code(stock_code)} {node} 节点检查点保存失败：{e}")
+
+
+async def load_node_checkpoints(pool: asyncpg.Pool, stock_code: str, report_date: datetime.date,
+                                business_type: int = 1) -> Dict[str, Dict[str, str]]:
+    """读取已完成节点：{node: {"content", "thinking"}}，读取失败时视为无检查点"""
+    try:
+        rows = await pool.fetch(
+            """
+            SELECT node, content, thinking FROM ai_agents.fundamental_node_checkpoints
+            WHERE stock_code = $1 AND report_date = $2 AND business_type = $3
+            """,
+            bare_code(stock_code), report_date, business_type
+        )
+    except Exception as e:
+        logger.exception(f"{bare_code(stock_code)} 节点检查点读取失败：{e}")
+        return {}
+    return {row["node"]: {"content": row["content"], "thinking": row["thinking"]} for row in rows}
+
+
+async def clear_node_checkpoints(pool: asyncpg.Pool, stock_code: str, report_date: datetime.date,
+                                 business_type: int = 1):
+    """完整结果持久化后清理该任务的检查点"""
+    try:
+        await pool.execute(
+            """
+            DELETE FROM ai_agents.fundamental_node_checkpoints
+            WHERE stock_code = $1 AND report_date = $2 AND business_type = $3
+            """,
+            bare_code(stock_code), report_date, business_type
+        )
+    except Exception as e:
+        logger.exception(f"{bare_code(stock_code)} 节点检查点清理失败：{e}")
+
+
+async def checkpointed(stream: AsyncIterator[Dict[str, Any]], pool: asyncpg.Pool, key: Tuple[str, datetime.date, int],
+                       node: str, result: Callable[[], Tuple[str, str]],
+                       completed: Optional[Set[str]] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    透传节点事件流；节点正常结束、无错误且有输出时在后台写入检查点
+    :param key: (股票代码, 报告期, 业务类型)
+    :param result: 节点结束后读取 (输出, 思考过程) 的函数
+    :param completed: 正常完成的节点名集合
+    """
+    failed = False
+    async for envelope in stream:
+        if envelope["data"]["phase"] == "error":
+            failed = True
+        yield envelope
+    content, thinking = result()
+    if failed or not content:
+        return
+    if completed is not None:
+        completed.add(node)
+    if pool is None:
+        return
+    task = asyncio.create_task(save_node_checkpoint(pool, *key, node, content, thinking))
+    _pending_writes.add(task)
+    task.add_done_callback(_pending_writes.discard)
+
+
+async def flush_checkpoint_writes():
+    """等待进行中的检查点写入完成"""
+    if _pending_writes:
+        await asyncio.gather(*_pending_writes, return_exceptions=True)
+
+
+def replay_events(node: str, checkpoint: Dict[str, str]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """由检查点生成该节点的输出事件与完成事件"""
+    data = {"annotation": {"checkpoint": True}, "model": "", "id": "", "index": 0}
+    return (
+        {"node": node, "state": "in_progress", "data": {"phase": "output", "content": checkpoint["content"], **data}},
+        {"node": node, "state": "done", "data": {"phase": "done", "content": "", **data}},
+    )
@@ -0,0 +1,152 @@
+"""
+    离线大模型替身：按配置替换豆包/KIMI/GPT 的流式输出（streaming_out 解析后的事件），不访问供应商，用于离线性能测试
+    事件来源：录制文件（LLM_RECORD_DIR 下录制的真实事件序列，按原时间间隔回放）或合成序列
+    启用：LLM_FAKE_PROVIDERS=all 或逗号分隔的供应商名（doubao,kimi,gpt）；LLM_FAKE_RECORDINGS 指定录制目录时优先回放
+    合成参数：LLM_FAKE_<名称> 全局生效，LLM_FAKE_<PROVIDER>_<名称> 按供应商覆盖，名称见 FAKE_DEFAULTS
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FAKE_PROVIDERS = {name.strip() for name in os.getenv("LLM_FAKE_PROVIDERS", "").split(",") if name.strip()}
+# 录制目录：设置后真实供应商的事件序列按节点写入 <目录>/<节点>.jsonl
+RECORD_DIR = os.getenv("LLM_RECORD_DIR", "")
+
+# 合成序列默认参数：首token延迟、token速率、思考/输出token数、错误注入概率、检索往返次数及耗时、检索引用数、回放速度倍数
+FAKE_DEFAULTS: Dict[str, float] = {
+    "first_token_ms": 800,
+    "tokens_per_second": 40,
+    "thinking_tokens": 60,
+    "output_tokens": 400,
+    "error_rate": 0,
+    "tool_calls": 0,
+    "tool_call_ms": 1500,
+    "annotations": 0,
+    "speed": 1.0,
+}
+# 与真实供应商行为一致的差异：KIMI先非流式检索一轮再流式输出，豆包联网检索带引用
+PROVIDER_DEFAULTS: Dict[str, Dict[str, float]] = {
+    "doubao": {"annotations": 3},
+    "kimi": {"tool_calls": 1},
+    "gpt": {"first_token_ms": 2000},
+}
+# 流结束事件：豆包为 completed，其余为 done（与各 streamer 的 _parse_events 一致）
+FINAL_PHASE = {"doubao": "completed"}
+
+_TEXT = "根据最新财报与行业数据，公司营收保持增长，毛利率小幅改善，现金流稳健，估值处于历史中位附近。"
+
+_recordings: Dict[str, Optional[List[Tuple[float, Dict[str, Any]]]]] = {}
+
+
+def fake_enabled(provider: str) -> bool:
+    return "all" in FAKE_PROVIDERS or provider in FAKE_PROVIDERS
+
+
+def fake_setting(provider: str, name: str) -> float:
+    default = PROVIDER_DEFAULTS.get(provider, {}).get(name, FAKE_DEFAULTS[name])
+    value = os.getenv(f"LLM_FAKE_{provider.upper()}_{name.upper()}") or os.getenv(f"LLM_FAKE_{name.upper()}")
+    return float(value) if value else default
+
+
+def load_recording(name: str) -> Optional[List[Tuple[float, Dict[str, Any]]]]:
+    """读取录制文件 <LLM_FAKE_RECORDINGS>/<name>.jsonl：每行 {"t": 相对开始的秒数, "event": 事件}，不存在时返回None"""
+    directory = os.getenv("LLM_FAKE_RECORDINGS", "")
+    if not directory:
+        return None
+    if name not in _recordings:
+        path = os.path.join(directory, f"{name}.jsonl")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                _recordings[name] = [(line["t"], line["event"]) for line in map(json.loads, f) if line]
+        except FileNotFoundError:
+            _recordings[name] = None
+    return _recordings[name]
+
+
+def synthetic_schedule(provider: str, node: str) -> Iterator[Tuple[float, Dict[str, Any]]]:
+    """合成事件序列 (相对开始的秒数, 事件)：检索往返 -> 首token -> 思考 -> 输出（间插检索引用） -> 结束"""
+    model, response_id = f"fake-{provider}", f"fake-{uuid.uuid4().hex[:12]}"
+    rate = max(fake_setting(provider, "tokens_per_second"), 1e-3)
+    start = (fake_setting(provider, "tool_calls") * fake_setting(provider, "tool_call_ms")
+             + fake_setting(provider, "first_token_ms")) / 1000
+    thinking = int(fake_setting(provider, "thinking_tokens"))
+    output = int(fake_setting(provider, "output_tokens"))
+    annotations = int(fake_setting(provider, "annotations"))
+    every = output // (annotations + 1) if annotations else 0
+
+    def event(phase: str, content: str, index: int, annotation: Optional[Dict[str, Any]] = None):
+        return {"phase": phase, "content": content, "annotation": annotation or {}, "model": model,
+                "id": response_id, "index": index}
+
+    for i in range(thinking):
+        yield start + i / rate, event("thinking", _TEXT[(2 * i) % len(_TEXT):][:2], i)
+    for i in range(output):
+        step = thinking + i
+        if every and i and i % every == 0 and i // every <= annotations:
+            yield start + step / rate, event("annotation", "", step, {
+                "title": f"模拟检索结果{i // every}", "type": "url_citation", "url": "https://example.com/",
+                "site_name": "example", "publish_time": "", "summary": ""})
+        content = f"【{node or provider}】" if i == 0 else _TEXT[(2 * i) % len(_TEXT):][:2]
+        yield start + step / rate, event("output", content, step)
+    yield start + (thinking + output) / rate, event(FINAL_PHASE.get(provider, "done"), "", thinking + output)
+
+
+async def fake_events(provider: str, node: str, create_params: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+    """按时间表产出替身事件；按 error_rate 在随机位置注入错误事件并结束"""
+    recording = load_recording(node) or load_recording(provider)
+    speed = max(fake_setting(provider, "speed"), 1e-3)
+    schedule = iter(recording) if recording is not None else synthetic_schedule(provider, node)
+    fail_at = random.random() if random.random() < fake_setting(provider, "error_rate") else None
+    expected = len(recording) if recording is not None else (
+        int(fake_setting(provider, "thinking_tokens")) + int(fake_setting(provider, "output_tokens")) + 1)
+    started = time.monotonic()
+    for position, (offset, event) in enumerate(schedule):
+        if fail_at is not None and position >= fail_at * expected:
+            yield {"phase": "error", "content": "错误信息：模拟供应商错误", "annotation": {},
+                   "model": event.get("model", ""), "id": event.get("id", ""), "index": position}
+            return
+        delay = started + offset / speed - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        yield event
+
+
+async def record_events(provider: str, node: str, events: AsyncIterator[Dict[str, Any]]
+                        ) -> AsyncIterator[Dict[str, Any]]:
+    """透传真实事件并记录时间，流正常结束且无错误时写入 <LLM_RECORD_DIR>/<节点>.jsonl"""
+    started = time.monotonic()
+    recorded: List[Dict[str, Any]] = []
+    failed = False
+    async for event in events:
+        recorded.append({"t": round(time.monotonic() - started, 4), "event": event})
+        failed = failed or event.get("phase") == "error"
+        yield event
+    if failed or not recorded:
+        return
+    path = os.path.join(RECORD_DIR, f"{node or provider}.jsonl")
+
+    def write():
+        os.makedirs(RECORD_DIR, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(line, ensure_ascii=False) + "\n" for line in recorded)
+
+    await asyncio.to_thread(write)
+    logger.info(f"{provider} {node} 事件序列已录制：{path}，{len(recorded)} 条")
+
+
+def provider_events(streamer, create_params: Dict[str, Any], node: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    节点事件来源：供应商启用替身时回放录制或合成序列，否则解析真实流式输出（设置 LLM_RECORD_DIR 时同时录制）
+    :param streamer: DoubaoAsyncStreamer / KimiAsyncStreamer / GPTAsyncStreamer 实例
+    """
+    if fake_enabled(streamer.provider):
+        return fake_events(streamer.provider, node, create_params)
+    events = streamer._parse_events(create_params)
+    return record_events(streamer.provider, node, events) if RECORD_DIR else events
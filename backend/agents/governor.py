@@ -0,0 +1,250 @@
+"""
+    大模型调用治理：每个供应商一个令牌桶限速 + 并发流数上限 + 有界等待队列
+    所有节点（交互式研究与批量任务）共享同一组治理器；排队时向客户端推送 queued 状态事件，
+    队列已满或等待超时则直接拒绝，避免突发请求触发供应商 429
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Dict, Optional
+
+from utilities.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 供应商默认限额：每秒请求数、令牌桶容量、最大并发流数、最大排队数
+GOVERNOR_LIMITS: Dict[str, Dict[str, float]] = {
+    "doubao": {"rps": 2, "burst": 5, "concurrency": 8, "queue": 32},
+    "kimi": {"rps": 1, "burst": 3, "concurrency": 4, "queue": 32},
+    "gpt": {"rps": 1, "burst": 3, "concurrency": 4, "queue": 16},
+}
+# 排队超过该时间（秒）后拒绝
+QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "120"))
+# 排队期间状态事件的推送间隔（秒）
+STATUS_INTERVAL = float(os.getenv("LLM_QUEUE_STATUS_INTERVAL", "2"))
+
+
+class GovernorRejected(Exception):
+    """请求被治理器拒绝（队列已满或等待超时）"""
+
+    def __init__(self, provider: str, reason: str):
+        super().__init__(f"{provider} 请求繁忙，已拒绝（{reason}）")
+        self.provider = provider
+        self.reason = reason
+
+
+class ProviderGovernor:
+    """单个供应商的治理器：先到先得，令牌与并发槽位同时满足时放行"""
+
+    def __init__(self, provider: str, rps: float, burst: float, concurrency: int, queue: int,
+                 queue_timeout: float = QUEUE_TIMEOUT):
+        self.provider = provider
+        self.rps = rps
+        self.burst = burst
+        self.concurrency = concurrency
+        self.max_queue = queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._waiters: deque = deque()  # [(future, cost)]
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # 统计
+        self.admitted = 0
+        self.rejected = 0
+        self.queued = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rps)
+        self._updated = now
+
+    def _try_take(self, cost: float) -> bool:
+        self._refill()
+        if self.active >= self.concurrency or self._tokens < cost:
+            return False
+        self._tokens -= cost
+        self.active += 1
+        return True
+
+    def _dispatch(self):
+        """按先后顺序放行排队请求；令牌不足时在补足所需时间后再次调度"""
+        self._timer = None
+        while self._waiters:
+            future, cost = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+            if self.active >= self.concurrency:
+                return
+            if not self._try_take(cost):
+                delay = (cost - self._tokens) / self.rps
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            self._waiters.popleft()
+            future.set_result(None)
+
+    def release(self):
+        self.active -= 1
+        if self._timer is None:
+            self._dispatch()
+
+    async def admit(self, cost: float = 1) -> AsyncIterator[Dict[str, Any]]:
+        """
+        申请一个并发槽位并消耗 cost 个令牌；排队期间按间隔产出状态，经排队放行时再产出一条 admitted 状态，
+        迭代结束即已获得槽位，调用方结束时须 release
+        :raise GovernorRejected: 队列已满或等待超时
+        """
+        cost = min(cost, self.burst)
+        if not self._waiters and self._try_take(cost):
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise GovernorRejected(self.provider, "queue full")
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((future, cost))
+        self.queued += 1
+        if self._timer is None:
+            self._dispatch()
+        started = time.monotonic()
+        try:
+            while not future.done():
+                waited = time.monotonic() - started
+                if waited >= self.queue_timeout:
+                    self.rejected += 1
+                    raise GovernorRejected(self.provider, "queue timeout")
+                yield {"admitted": False, "waitedMs": round(waited * 1000), "position": self.position(future),
+                       "active": self.active}
+                try:
+                    await asyncio.wait_for(asyncio.shield(future),
+                                           timeout=min(STATUS_INTERVAL, self.queue_timeout - waited))
+                except asyncio.TimeoutError:
+                    pass
+            waited_ms = (time.monotonic() - started) * 1000
+            self.admitted += 1
+            self.wait_ms_total += waited_ms
+            self.wait_ms_max = max(self.wait_ms_max, waited_ms)
+            yield {"admitted": True, "waitedMs": round(waited_ms), "position": 0, "active": self.active}
+        except BaseException:
+            if future.done() and not future.cancelled():
+                # 已放行但调用方取消，归还槽位
+                self.release()
+            else:
+                # 取消或超时的等待者移出队列，不再占用队列长度
+                future.cancel()
+                try:
+                    self._waiters.remove((future, cost))
+                except ValueError:
+                    pass
+            raise
+
+    def position(self, future: asyncio.Future) -> int:
+        for i, (waiter, _) in enumerate(w for w in self._waiters if not w[0].done()):
+            if waiter is future:
+                return i + 1
+        return 0
+
+    def stats(self) -> Dict[str, Any]:
+        self._refill()
+        return {
+            "rps": self.rps,
+            "burst": self.burst,
+            "concurrency": self.concurrency,
+            "active": self.active,
+            "waiting": sum(1 for future, _ in self._waiters if not future.done()),
+            "tokens": round(self._tokens, 2),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "waitMsAvg": round(self.wait_ms_total / self.queued, 1) if self.queued else 0.0,
+            "waitMsMax": round(self.wait_ms_max, 1),
+        }
+
+
+def _limit(provider: str, name: str) -> float:
+    return float(os.getenv(f"LLM_{provider.upper()}_{name.upper()}", GOVERNOR_LIMITS[provider][name]))
+
+
+class GovernorRegistry:
+    """供应商治理器注册表，限额可由环境变量 LLM_<PROVIDER>_<RPS|BURST|CONCURRENCY|QUEUE> 覆盖"""
+
+    def __init__(self):
+        self._governors: Dict[str, ProviderGovernor] = {}
+
+    def get(self, provider: str) -> ProviderGovernor:
+        governor = self._governors.get(provider)
+        if governor is None:
+            governor = self._governors[provider] = ProviderGovernor(
+                provider,
+                rps=_limit(provider, "rps"),
+                burst=_limit(provider, "burst"),
+                concurrency=int(_limit(provider, "concurrency")),
+                queue=int(_limit(provider, "queue")),
+            )
+        return governor
+
+    def stats(self) -> Dict[str, Any]:
+        return {provider: self.get(provider).stats() for provider in GOVERNOR_LIMITS}
+
+
+governors = GovernorRegistry()
+
+
+def _status_event(phase: str, content: str, annotation: Dict[str, Any]) -> Dict[str, Any]:
+    return {"phase": phase, "content": content, "annotation": annotation, "model": "", "id": "", "index": 0}
+
+
+async def governed(provider: str, events: AsyncIterator[Dict[str, Any]], cost: float = 1
+                   ) -> AsyncIterator[Dict[str, Any]]:
+    """
+    在治理器放行后读取节点事件流，结束时归还并发槽位
+    排队期间产出 phase=queued 状态事件，放行时产出 phase=admitted（含排队耗时），被拒绝时产出 phase=error
+    :param cost: 本次流式输出包含的供应商请求数（如Kimi先检索再输出为2次）
+    """
+    governor = governors.get(provider)
+    admission = governor.admit(cost)
+    try:
+        async for status in admission:
+            if status["admitted"]:
+                yield _status_event("admitted", "", {"provider": provider, "waitedMs": status["waitedMs"]})
+            else:
+                yield _status_event("queued", f"{provider} 排队中，前方 {status['position'] - 1} 个请求",
+                                    {"provider": provider, **status})
+    except GovernorRejected as e:
+        logger.warning(str(e))
+        await events.aclose()  # type: ignore
+        yield _status_event("error", str(e), {"provider": provider, "reason": e.reason})
+        return
+    finally:
+        # 排队期间被关闭时立即撤销排队（或归还已获得的槽位）
+        await admission.aclose()
+    try:
+        async for event in events:
+            yield event
+    finally:
+        governor.release()
+        await events.aclose()  # type: ignore
+
+
+def _collect_governor_metrics():
+    """治理器统计导出到 /metrics"""
+    snapshot = governors.stats()
+    for name, kind, field, documentation in (
+            ("llm_governor_active_streams", "gauge", "active", "当前占用的并发流数"),
+            ("llm_governor_waiting", "gauge", "waiting", "当前排队的请求数"),
+            ("llm_governor_admitted_total", "counter", "admitted", "已放行的请求数"),
+            ("llm_governor_queued_total", "counter", "queued", "经过排队的请求数"),
+            ("llm_governor_rejected_total", "counter", "rejected", "被拒绝的请求数"),
+            ("llm_governor_wait_ms_max", "gauge", "waitMsMax", "最长排队耗时（毫秒）"),
+    ):
+        yield name, kind, documentation, [({"provider": provider}, stats[field])
+                                          for provider, stats in snapshot.items()]
+
+
+metrics.register_collector(_collect_governor_metrics)
@@ -0,0 +1,115 @@
+"""
+    已持久化研究结果查询：进程内LRU缓存最近的 (股票代码, 报告期, 业务类型) 结果，命中时不访问数据库；
+    未命中时先用覆盖索引做只取id的存在性探测，存在时再按主键读取 state
+    索引见 databases/migrations/004_agent_state_lookup_index.sql
+"""
+import datetime
+import logging
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import asyncpg
+
+from utilities.basic_funcs import bare_code
+
+logger = logging.getLogger(__name__)
+
+HISTORY_CACHE_SIZE = int(os.getenv("AGENT_HISTORY_CACHE_SIZE", "512"))
+
+HistoryKey = Tuple[str, datetime.date, int]
+
+
+class HistoryCache:
+    """研究结果LRU缓存：{(股票代码, 报告期, 业务类型): state}"""
+
+    def __init__(self, size: int = HISTORY_CACHE_SIZE):
+        self.size = size
+        self._items: "OrderedDict[HistoryKey, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.probes = 0
+
+    @staticmethod
+    def key(stock_code: str, report_date: datetime.date, business_type: int = 1) -> HistoryKey:
+        return bare_code(stock_code), report_date, business_type
+
+    def get(self, key: HistoryKey) -> Optional[Dict[str, Any]]:
+        state = self._items.get(key)
+        if state is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return state
+
+    def put(self, key: HistoryKey, state: Dict[str, Any]):
+        self._items[key] = state
+        self._items.move_to_end(key)
+        while len(self._items) > self.size:
+            self._items.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"size": len(self._items), "capacity": self.size, "hits": self.hits, "misses": self.misses,
+                "probes": self.probes}
+
+
+history_cache = HistoryCache()
+
+
+async def probe_history(pool: asyncpg.Pool, key: HistoryKey) -> Optional[int]:
+    """存在性探测：只取最新一条记录的id（覆盖索引上的仅索引扫描），不存在时返回None"""
+    history_cache.probes += 1
+    return await pool.fetchval(
+        """
+        SELECT id FROM ai_agents.fundamental_agents_state
+        WHERE stock_code = $1 AND report_date = $2 AND business_type = $3
+        ORDER BY created_at DESC
+        LIMIT 1
+        """,
+        *key
+    )
+
+
+async def history_exists(pool: Optional[asyncpg.Pool], stock_code: str, report_date: datetime.date,
+                         business_type: int = 1) -> bool:
+    """是否已有持久化结果，缓存命中时不访问数据库"""
+    key = history_cache.key(stock_code, report_date, business_type)
+    if history_cache.get(key) is not None:
+        return True
+    if pool is None:
+        logger.error("pg_pool is None, cannot query history")
+        return False
+    try:
+        return await probe_history(pool, key) is not None
+    except Exception as e:
+        logger.exception(f"{key} 持久化结果探测失败：{e}")
+        return False
+
+
+async def get_history_state(pool: Optional[asyncpg.Pool], stock_code: str, report_date: datetime.date,
+                            business_type: int = 1) -> Optional[Dict[str, Any]]:
+    """读取最新的持久化结果，不存在时返回None；读取后写入缓存"""
+    key = history_cache.key(stock_code, report_date, business_type)
+    state = history_cache.get(key)
+    if state is not None:
+        return state
+    if pool is None:
+        logger.error("pg_pool is None, cannot query history")
+        return None
+    try:
+        state_id = await probe_history(pool, key)
+        if state_id is None:
+            return None
+        state = await pool.fetchval("SELECT state FROM ai_agents.fundamental_agents_state WHERE id = $1", state_id)
+    except Exception as e:
+        logger.exception(f"{key} 持久化结果读取失败：{e}")
+        return None
+    if state is not None:
+        history_cache.put(key, state)
+    return state
+
+
+def remember_history(stock_code: str, report_date: datetime.date, state: Dict[str, Any], business_type: int = 1):
+    """新结果持久化后写入缓存，随后的请求直接命中"""
+    history_cache.put(history_cache.key(stock_code, report_date, business_type), state)
@@ -0,0 +1,29 @@
+from pydantic import BaseModel, Field, ConfigDict, model_validator
+from typing import Optional, List, Annotated
+
+
+class BatchResearchRequest(BaseModel):
+    """批量研究请求：按策略组合或代码列表"""
+    model_config = ConfigDict(
+        populate_by_name=True,
+        str_strip_whitespace=True,
+        json_schema_extra={
+            "examples": [
+                {"strategyId": 3, "stage": 1, "datePeriod": 3},
+                {"codes": ["600519.SH", "000001.SZ"], "reportDate": "2025-10-15"},
+            ]
+        }
+    )
+    strategy_id: Annotated[Optional[int], Field(alias='strategyId', description="策略ID，与codes二选一")] = None
+    codes: Annotated[Optional[List[str]], Field(description="股票代码列表，与strategyId二选一")] = None
+    report_date: Annotated[Optional[str], Field(alias='reportDate', description="报告日期，为空时取当日")] = ""
+    date_period: Annotated[Optional[int], Field(alias='datePeriod', description="强势股跟踪交易日区间")] = 3
+    stage: Annotated[Optional[int], Field(description="强势股跟踪信号池")] = 1
+    concurrency: Annotated[Optional[int], Field(ge=1, description="并发数，不超过服务端上限")] = None
+
+    @model_validator(mode='after')
+    def validate_source(self) -> 'BatchResearchRequest':
+        """策略ID与代码列表必须且只能提供一个"""
+        if (self.strategy_id is None) == (not self.codes):
+            raise ValueError('strategyId 与 codes 必须且只能提供一个')
+        return self
@@ -0,0 +1,114 @@
+"""
+    提示词模板注册表：启动时一次性加载 agents/prompts 下全部yaml并预编译为不可变模板，
+    模板按 {{ slot }} 切分为文本段与槽位，渲染只做拼接；文件修改后按mtime自动重新加载
+"""
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Tuple
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+PROMPT_DIR = Path(__file__).parent / "prompts"
+RELOAD_CHECK_SECONDS = float(os.getenv("PROMPT_RELOAD_INTERVAL", "2"))
+
+_SLOT_PATTERN = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """预编译提示词：segments 中偶数位为文本段，奇数位为槽位名"""
+    name: str
+    segments: Tuple[str, ...]
+
+    @classmethod
+    def compile(cls, name: str, text: str) -> "PromptTemplate":
+        return cls(name, tuple(_SLOT_PATTERN.split(text)))
+
+    @property
+    def slots(self) -> Tuple[str, ...]:
+        return self.segments[1::2]
+
+    def render(self, **values) -> str:
+        """填充槽位，未提供的槽位保留原占位符"""
+        if len(self.segments) == 1:
+            return self.segments[0]
+        parts = list(self.segments)
+        for i in range(1, len(parts), 2):
+            value = values.get(parts[i])
+            parts[i] = "{{ " + parts[i] + " }}" if value is None else str(value)
+        return "".join(parts)
+
+
+@lru_cache(maxsize=256)
+def _render_cached(template: PromptTemplate, items: Tuple[Tuple[str, str], ...]) -> str:
+    return template.render(**dict(items))
+
+
+class PromptRegistry:
+    """提示词注册表：{文件名（不含扩展名）: {键: PromptTemplate}}"""
+
+    def __init__(self, directory: Path = PROMPT_DIR):
+        self.directory = directory
+        self._templates: Dict[str, Dict[str, PromptTemplate]] = {}
+        self._mtimes: Dict[str, float] = {}
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def _scan(self) -> Dict[str, float]:
+        return {path.stem: path.stat().st_mtime for path in sorted(self.directory.glob("*.yaml"))}
+
+    def load(self):
+        """加载（或重新加载）有变化的提示词文件"""
+        with self._lock:
+            mtimes = self._scan()
+            for stem, mtime in mtimes.items():
+                if self._mtimes.get(stem) == mtime:
+                    continue
+                try:
+                    with open(self.directory / f"{stem}.yaml", "r", encoding="utf-8") as f:
+                        raw = yaml.safe_load(f) or {}
+                except Exception as e:
+                    # 编辑中的文件可能暂时不合法，保留旧版本
+                    logger.error(f"提示词文件 {stem}.yaml 加载失败：{e}")
+                    continue
+                self._templates[stem] = {key: PromptTemplate.compile(f"{stem}.{key}", str(text))
+                                         for key, text in raw.items()}
+                if stem in self._mtimes:
+                    self.reloads += 1
+                    logger.info(f"提示词文件 {stem}.yaml 已重新加载")
+                self._mtimes[stem] = mtime
+            for stem in set(self._templates) - set(mtimes):
+                del self._templates[stem]
+                del self._mtimes[stem]
+            self._last_check = time.monotonic()
+
+    def _maybe_reload(self):
+        if not self._templates or time.monotonic() - self._last_check >= RELOAD_CHECK_SECONDS:
+            self.load()
+
+    def get(self, file: str, key: str) -> PromptTemplate:
+        """获取模板对象，不存在时抛出 KeyError"""
+        self._maybe_reload()
+        return self._templates[file][key]
+
+    def render(self, file: str, key: str, cache: bool = True, **values) -> str:
+        """
+        渲染模板
+        :param cache: 槽位取值重复度高（如 today）时缓存渲染结果，逐请求变化的取值（如行情数据）应关闭
+        """
+        template = self.get(file, key)
+        if not cache:
+            return template.render(**values)
+        return _render_cached(template, tuple(sorted((k, str(v)) for k, v in values.items())))
+
+
+prompt_registry = PromptRegistry()
@@ -0,0 +1,85 @@
+"""
+    大模型异步客户端注册表：应用启动时创建一次、所有请求共享
+    每个供应商一个 httpx 异步连接池（keep-alive 复用TLS连接），安装 h2 时对支持的供应商启用 HTTP/2
+    供应商SDK（openai、volcenginesdkarkruntime）导入耗时较长，在创建客户端时才导入，不计入应用导入时间
+"""
+import importlib.util
+import os
+import threading
+from typing import Any, Dict
+
+from dotenv import load_dotenv
+
+from agents.fake_provider import fake_enabled
+
+load_dotenv()  # 加载环境变量
+
+# HTTP/2 依赖 h2 包，未安装时回退 HTTP/1.1
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None and os.getenv("LLM_HTTP2", "1") != "0"
+
+# 供应商配置：base_url、密钥环境变量、是否支持HTTP/2
+PROVIDER_CONFIGS: Dict[str, Dict[str, Any]] = {
+    "doubao": {"base_url": "https://ark.cn-beijing.volces.com/api/v3", "api_key_env": "ARK_API_KEY", "http2": True},
+    "kimi": {"base_url": "https://api.moonshot.cn/v1", "api_key_env": "KIMI_API_KEY", "http2": True},
+    "gpt": {"base_url": "https://api.aiionly.com/v1", "api_key_env": "AIONLY_API_KEY", "http2": False},
+}
+
+# 连接池参数：每个供应商的最大连接数、空闲长连接数及保活时间（秒）
+MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "50"))
+MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY = 120
+
+_clients: Dict[str, Any] = {}
+# 启动预热在工作线程创建客户端，与请求路径上的按需创建互斥
+_clients_lock = threading.Lock()
+
+
+def _create_client(provider: str):
+    import httpx
+
+    config = PROVIDER_CONFIGS[provider]
+    http2 = HTTP2_AVAILABLE and config["http2"]
+    api_key = os.getenv(config["api_key_env"])
+    limits = httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE,
+                          keepalive_expiry=KEEPALIVE_EXPIRY)
+    # 流式响应读超时由 streamer 逐事件控制，这里只限制连接建立
+    timeout = httpx.Timeout(connect=10.0, read=None, write=30.0, pool=30.0)
+    if provider == "doubao":
+        from volcenginesdkarkruntime import AsyncArk
+        return AsyncArk(
+            base_url=config["base_url"], api_key=api_key, timeout=timeout,
+            http_client=httpx.AsyncClient(limits=limits, http2=http2, timeout=timeout),
+        )
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+    return AsyncOpenAI(
+        base_url=config["base_url"], api_key=api_key, timeout=timeout,
+        http_client=DefaultAsyncHttpxClient(limits=limits, http2=http2, timeout=timeout),
+    )
+
+
+def init_provider_clients():
+    """
+    创建已配置密钥的供应商客户端（导入SDK），未配置或启用离线替身的供应商跳过
+    应用启动时在后台线程调用，不阻塞 worker 开始接收请求
+    """
+    for provider, config in PROVIDER_CONFIGS.items():
+        if os.getenv(config["api_key_env"]) and not fake_enabled(provider):
+            get_client(provider)
+
+
+async def close_provider_clients():
+    """应用关闭时释放连接池"""
+    for provider, client in list(_clients.items()):
+        await client.close()
+        _clients.pop(provider, None)
+
+
+def get_client(provider: str):
+    """获取共享客户端，未初始化时（如脚本调用、预热未完成）按需创建"""
+    client = _clients.get(provider)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(provider)
+            if client is None:
+                client = _clients[provider] = _create_client(provider)
+    return client
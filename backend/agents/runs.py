@@ -0,0 +1,280 @@
+"""
+    运行中研究任务注册表（single-flight）
+    同一 (股票代码, 报告期, 业务类型) 同时只运行一条智能体流水线：后到的请求挂载到运行中的流水线，
+    先补发已产生的事件，再接收实时事件；所有订阅者断开并超过宽限期后取消流水线
+    每条事件带单调递增id并保存在有界环形缓冲中，断线重连（Last-Event-ID）从下一条事件续传；
+    结束的流水线保留一段时间供续传，缓冲按条数、字节数及全局内存上限淘汰
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+from fastapi import Request
+
+logger = logging.getLogger(__name__)
+
+# 最后一个订阅者断开后保留流水线的时间（秒），期间重连的客户端可继续接收
+ORPHAN_GRACE_SECONDS = float(os.getenv("AGENT_RUN_ORPHAN_GRACE", "15"))
+# 单条流水线事件缓冲上限（条数、字节数），超出后淘汰最早的事件
+RUN_BUFFER_EVENTS = int(os.getenv("AGENT_RUN_BUFFER_EVENTS", "50000"))
+RUN_BUFFER_BYTES = int(os.getenv("AGENT_RUN_BUFFER_BYTES", str(8 * 1024 * 1024)))
+# 流水线结束后保留事件缓冲的时间（秒）
+RUN_RETAIN_SECONDS = float(os.getenv("AGENT_RUN_RETAIN_SECONDS", "120"))
+# 全部流水线事件缓冲的内存上限，超出后按结束先后淘汰已结束的流水线
+RUN_TOTAL_BYTES = int(os.getenv("AGENT_RUN_TOTAL_BYTES", str(64 * 1024 * 1024)))
+
+# 每条事件除文本内容外的估算开销（字典、键名、元数据）
+_EVENT_OVERHEAD = 256
+
+
+def event_size(envelope: Dict[str, Any]) -> int:
+    """事件占用内存估算：文本内容的UTF-8字节数 + 固定开销"""
+    data = envelope.get("data")
+    content = data.get("content") if isinstance(data, dict) else envelope.get("content")
+    return _EVENT_OVERHEAD + (len(content.encode("utf-8")) if isinstance(content, str) else 0)
+
+
+def parse_resume_id(value: Optional[str]) -> Tuple[int, List[int]]:
+    """
+    解析续传id（见 agents.sse.resume_id）："last_id" 或 "last_id:起点1,起点2"
+    :return: (last_id, 各节点未发送起点)，无法解析时视为从头开始
+    """
+    if not value:
+        return 0, []
+    head, _, tail = value.strip().partition(":")
+    try:
+        return int(head), [int(first) for first in tail.split(",") if first]
+    except ValueError:
+        return 0, []
+
+
+def resync_event(missed: int) -> Dict[str, Any]:
+    """续传位置早于缓冲中最早事件时的提示事件，客户端应丢弃已接收内容"""
+    return {"node": "", "state": "in_progress",
+            "data": {"phase": "resync", "content": "", "annotation": {"missed": missed},
+                     "model": "", "id": "", "index": 0}}
+
+
+class PipelineRun:
+    """一次流水线运行：后台任务产出事件信封，写入事件日志并唤醒订阅者"""
+
+    def __init__(self, key: Hashable, pipeline: Callable[[], AsyncIterator[Dict[str, Any]]],
+                 on_finished: Optional[Callable[["PipelineRun"], None]] = None):
+        """
+        :param key: 注册表键
+        :param pipeline: 返回事件信封异步生成器的函数
+        :param on_finished: 流水线结束（含取消、异常）后的回调
+        """
+        self.key = key
+        self.buffer: Deque[Tuple[int, Dict[str, Any], int]] = deque()  # (事件id, 信封, 估算字节)
+        self.buffer_bytes = 0
+        self.last_id = 0
+        self.evicted = 0
+        self.finished = False
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self.subscribers = 0
+        self.started_at = time.time()
+        self._pipeline = pipeline
+        self._on_finished = on_finished
+        self._wakeup: Optional[asyncio.Future] = None
+        self._orphan_timer: Optional[asyncio.TimerHandle] = None
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        try:
+            async for envelope in self._pipeline():
+                self._append(envelope)
+                self._notify()
+        except asyncio.CancelledError:
+            self.error = "cancelled"
+            logger.info(f"{self.key} 流水线已取消")
+        except Exception as e:
+            self.error = str(e)
+            logger.exception(f"{self.key} 流水线异常：{e}")
+        finally:
+            self.finished = True
+            self.finished_at = time.time()
+            self._notify()
+            if self._on_finished is not None:
+                self._on_finished(self)
+
+    @property
+    def first_id(self) -> int:
+        """缓冲中最早事件的id，缓冲为空时为下一条事件的id"""
+        return self.buffer[0][0] if self.buffer else self.last_id + 1
+
+    def _append(self, envelope: Dict[str, Any]):
+        self.last_id += 1
+        size = event_size(envelope)
+        self.buffer.append((self.last_id, envelope, size))
+        self.buffer_bytes += size
+        while len(self.buffer) > 1 and (len(self.buffer) > RUN_BUFFER_EVENTS or self.buffer_bytes > RUN_BUFFER_BYTES):
+            _, _, evicted_size = self.buffer.popleft()
+            self.buffer_bytes -= evicted_size
+            self.evicted += 1
+
+    def _notify(self):
+        if self._wakeup is not None:
+            if not self._wakeup.done():
+                self._wakeup.set_result(None)
+            self._wakeup = None
+
+    async def _wait(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.get_running_loop().create_future()
+        await self._wakeup
+
+    async def _watch_disconnect(self, request: Request, state: Dict[str, bool]):
+        while True:
+            message = await request.receive()
+            if message["type"] == "http.disconnect":
+                state["disconnected"] = True
+                self._notify()
+                return
+
+    def _event(self, event_id: int) -> Dict[str, Any]:
+        return self.buffer[event_id - self.first_id][1]
+
+    async def subscribe(self, request: Optional[Request] = None, after: int = 0,
+                        unsent: Optional[List[int]] = None) -> AsyncIterator[Tuple[Dict[str, Any], int]]:
+        """
+        订阅事件：先补发客户端未收到的缓冲事件，再等待实时事件，流水线结束或客户端断开时返回
+        :param request: 传入时监听客户端断开
+        :param after: 续传id中的 last_id，0 表示从头开始
+        :param unsent: 续传id中各节点的未发送起点，这些节点在 after 之前的事件从起点开始补发
+        :return: (信封, 事件id)，与 coalesce(with_meta=True) 的输入格式一致
+        """
+        self.subscribers += 1
+        if self._orphan_timer is not None:
+            self._orphan_timer.cancel()
+            self._orphan_timer = None
+        state = {"disconnected": False}
+        watcher = asyncio.create_task(self._watch_disconnect(request, state)) if request is not None else None
+        next_id = after + 1
+        try:
+            if unsent and min(unsent) >= self.first_id and after <= self.last_id:
+                # 先按id顺序补发合帧时尚未发送的节点事件
+                starts = {self._event(first).get("node", ""): first for first in unsent}
+                for event_id in range(min(unsent), after + 1):
+                    if event_id < self.first_id:
+                        break
+                    envelope = self._event(event_id)
+                    if event_id >= starts.get(envelope.get("node", ""), after + 1):
+                        yield envelope, event_id
+            elif unsent:
+                next_id = min(unsent)
+            while not state["disconnected"]:
+                if next_id < self.first_id:
+                    # 续传位置已被淘汰：提示客户端重置，从缓冲中最早的事件继续
+                    logger.warning(f"{self.key} 续传位置 {next_id} 早于缓冲起点 {self.first_id}")
+                    yield resync_event(self.first_id - next_id), self.first_id - 1
+                    next_id = self.first_id
+                    continue
+                if next_id <= self.last_id:
+                    envelope = self._event(next_id)
+                    event_id = next_id
+                    next_id += 1
+                    yield envelope, event_id
+                    continue
+                if self.finished:
+                    return
+                await self._wait()
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.finished:
+                self._orphan_timer = asyncio.get_running_loop().call_later(ORPHAN_GRACE_SECONDS, self._cancel_orphan)
+
+    def _cancel_orphan(self):
+        self._orphan_timer = None
+        if self.subscribers == 0 and not self.finished:
+            logger.info(f"{self.key} 无订阅者，取消流水线")
+            self._task.cancel()
+
+    def cancel(self):
+        self._task.cancel()
+
+
+class RunRegistry:
+    """流水线注册表：运行中的流水线，以及结束后保留供续传的流水线"""
+
+    def __init__(self):
+        self._runs: Dict[Hashable, PipelineRun] = {}
+        self.started = 0
+        self.attached = 0
+        self.resumed = 0
+
+    def get(self, key: Hashable) -> Optional[PipelineRun]:
+        return self._runs.get(key)
+
+    def get_or_start(self, key: Hashable, pipeline: Callable[[], AsyncIterator[Dict[str, Any]]]) -> PipelineRun:
+        """存在运行中的流水线时直接返回，否则启动新流水线（替换已结束的流水线）"""
+        run = self._runs.get(key)
+        if run is not None and not run.finished:
+            self.attached += 1
+            return run
+        run = PipelineRun(key, pipeline, on_finished=self._finished)
+        self._runs[key] = run
+        self.started += 1
+        return run
+
+    def resumable(self, key: Hashable, last_event_id: int = 0) -> Optional[PipelineRun]:
+        """
+        可直接订阅的流水线：运行中的流水线；或客户端续传（last_event_id > 0）时已正常结束、仍保留缓冲的流水线
+        新请求不复用已结束的流水线，由持久化结果或新流水线处理
+        """
+        run = self._runs.get(key)
+        if run is None or (run.finished and (not last_event_id or run.error is not None)):
+            return None
+        if last_event_id:
+            self.resumed += 1
+        else:
+            self.attached += 1
+        return run
+
+    def _finished(self, run: PipelineRun):
+        """结束的流水线保留 RUN_RETAIN_SECONDS 秒供续传"""
+        asyncio.get_running_loop().call_later(RUN_RETAIN_SECONDS, self._remove, run)
+        self._enforce_budget()
+
+    def _remove(self, run: PipelineRun):
+        if self._runs.get(run.key) is run:
+            del self._runs[run.key]
+
+    def _enforce_budget(self):
+        """总缓冲超出上限时，按结束先后淘汰已结束的流水线"""
+        total = self.buffer_bytes
+        if total <= RUN_TOTAL_BYTES:
+            return
+        for run in sorted((r for r in self._runs.values() if r.finished), key=lambda r: r.finished_at):
+            self._remove(run)
+            total -= run.buffer_bytes
+            if total <= RUN_TOTAL_BYTES:
+                break
+
+    @property
+    def buffer_bytes(self) -> int:
+        return sum(run.buffer_bytes for run in self._runs.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": sum(1 for run in self._runs.values() if not run.finished),
+            "retained": sum(1 for run in self._runs.values() if run.finished),
+            "started": self.started,
+            "attached": self.attached,
+            "resumed": self.resumed,
+            "bufferBytes": self.buffer_bytes,
+            "runs": [{"key": [str(k) for k in run.key] if isinstance(run.key, tuple) else str(run.key),
+                      "finished": run.finished, "lastEventId": run.last_id, "firstEventId": run.first_id,
+                      "bufferedEvents": len(run.buffer), "bufferBytes": run.buffer_bytes,
+                      "evicted": run.evicted, "subscribers": run.subscribers}
+                     for run in self._runs.values()],
+        }
+
+
+pipeline_runs = RunRegistry()
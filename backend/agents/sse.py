@@ -0,0 +1,224 @@
+"""
+    SSE输出层：节点事件信封（{"node", "state", "data"}）的合帧与序列化
+    同一节点、同一阶段（thinking/output）连续的增量token在时间窗口或字节阈值内合并为一帧；
+    阶段切换、完成、错误、引用等事件到达时先冲刷该节点缓冲，再立即输出，不做延迟
+"""
+import asyncio
+import os
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from utilities.result_builder import dumps
+
+# 默认合帧参数，可由客户端通过 coalesceMs / coalesceBytes 覆盖
+COALESCE_MS = int(os.getenv("AGENT_COALESCE_MS", "50"))
+COALESCE_BYTES = int(os.getenv("AGENT_COALESCE_BYTES", "2048"))
+# 客户端可设置的上限，避免过大的窗口拖慢首屏
+MAX_COALESCE_MS = 1000
+MAX_COALESCE_BYTES = 65536
+
+# 可合并的增量阶段
+MERGEABLE_PHASES = ("thinking", "output")
+
+
+def format_event(envelope: Dict[str, Any], event_id: Optional[Any] = None) -> str:
+    """信封序列化为一条SSE消息"""
+    body = dumps(envelope).decode("utf-8")
+    if event_id is None:
+        return f"data: {body}\n\n"
+    return f"id: {event_id}\ndata: {body}\n\n"
+
+
+def _mergeable(envelope: Dict[str, Any]) -> bool:
+    data = envelope.get("data")
+    return (envelope.get("state") == "in_progress" and isinstance(data, dict)
+            and data.get("phase") in MERGEABLE_PHASES and isinstance(data.get("content"), str))
+
+
+class _Pending:
+    """某节点当前阶段的待合并增量"""
+    __slots__ = ("envelope", "parts", "size")
+
+    def __init__(self, envelope: Dict[str, Any]):
+        self.envelope = envelope
+        self.parts: List[str] = [envelope["data"]["content"]]
+        self.size = len(self.parts[0].encode("utf-8"))
+
+    @property
+    def phase(self) -> str:
+        return self.envelope["data"]["phase"]
+
+    def add(self, envelope: Dict[str, Any]):
+        content = envelope["data"]["content"]
+        self.parts.append(content)
+        self.size += len(content.encode("utf-8"))
+        self.envelope = envelope  # 合并帧沿用最后一条的 model/id/index
+
+    def build(self) -> Dict[str, Any]:
+        if len(self.parts) == 1:
+            return self.envelope
+        data = dict(self.envelope["data"])
+        data["content"] = "".join(self.parts)
+        return {**self.envelope, "data": data}
+
+
+class Coalescer:
+    """
+    增量合帧器：push 输入事件、返回应立即输出的帧；flush 输出全部缓冲
+    :param window_ms: 合帧时间窗口（毫秒），从节点缓冲的第一条增量开始计时；0 表示不合帧
+    :param max_bytes: 单个节点缓冲的字节阈值，达到后立即输出
+    """
+
+    def __init__(self, window_ms: int = COALESCE_MS, max_bytes: int = COALESCE_BYTES):
+        self.window = max(0, min(window_ms, MAX_COALESCE_MS)) / 1000
+        self.max_bytes = max(1, min(max_bytes, MAX_COALESCE_BYTES))
+        self._pending: Dict[str, _Pending] = {}  # 按首条增量到达先后排列
+        self._meta: Dict[str, Any] = {}
+        self._deadline: Optional[float] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    @property
+    def deadline(self) -> Optional[float]:
+        return self._deadline
+
+    def push(self, envelope: Dict[str, Any], meta: Any = None) -> List[Tuple[Dict[str, Any], Tuple[Any, Any]]]:
+        """
+        :param meta: 随帧透传的附加信息（如事件id）
+        :return: [(帧, (首条meta, 末条meta))]，未合并的帧首末相同
+        """
+        node = envelope.get("node", "")
+        pending = self._pending.get(node)
+        if self.enabled and _mergeable(envelope):
+            if pending is not None and pending.phase == envelope["data"]["phase"]:
+                pending.add(envelope)
+                self._meta[node] = (self._meta[node][0], meta)
+                if pending.size >= self.max_bytes:
+                    return [self._pop(node)]
+                return []
+            out = [self._pop(node)] if pending is not None else []
+            self._pending[node] = _Pending(envelope)
+            self._meta[node] = (meta, meta)
+            if self._deadline is None:
+                self._deadline = time.monotonic() + self.window
+            if self._pending[node].size >= self.max_bytes:
+                out.append(self._pop(node))
+            return out
+        # 阶段切换或非增量事件：先冲刷该节点缓冲，保证节点内顺序；无节点的全局事件（如整体完成）冲刷全部缓冲
+        if not node:
+            out = self.flush()
+        else:
+            out = [self._pop(node)] if pending is not None else []
+        out.append((envelope, (meta, meta)))
+        return out
+
+    def pending_first(self) -> Dict[str, Any]:
+        """各节点缓冲中首条增量的meta"""
+        return {node: meta[0] for node, meta in self._meta.items()}
+
+    def flush(self) -> List[Tuple[Dict[str, Any], Tuple[Any, Any]]]:
+        out = [self._pop(node) for node in list(self._pending)]
+        self._deadline = None
+        return out
+
+    def _pop(self, node: str) -> Tuple[Dict[str, Any], Tuple[Any, Any]]:
+        pending = self._pending.pop(node)
+        if not self._pending:
+            self._deadline = None
+        return pending.build(), self._meta.pop(node, (None, None))
+
+
+def resume_id(last_id: int, unsent: Dict[str, int]) -> str:
+    """
+    续传id：last_id 之前的事件中，除 unsent 所列节点自其首条未发送事件起的部分外均已发送
+    合帧只在节点内合并、跨节点会改变先后，单个事件id无法表达已发送集合，因此附带各节点未发送起点
+    :return: "last_id" 或 "last_id:起点1,起点2"
+    """
+    if not unsent:
+        return str(last_id)
+    return f"{last_id}:" + ",".join(str(first) for first in sorted(unsent.values()))
+
+
+async def coalesce(events: AsyncIterator[Any], window_ms: int = COALESCE_MS, max_bytes: int = COALESCE_BYTES,
+                   with_meta: bool = False, resume_ids: bool = False) -> AsyncIterator[Any]:
+    """
+    对信封流合帧
+    :param events: 信封流；with_meta 为 True 时元素为 (信封, meta)，合并帧的meta取最后一条的值
+    :param resume_ids: 输入meta为单调递增的事件id时，输出meta改为续传id（见 resume_id）
+    :return: 与输入同构的流
+    """
+    coalescer = Coalescer(window_ms, max_bytes)
+    iterator = events.__aiter__()
+    pushed = 0  # 已进入合帧器的最后一条事件id
+
+    def unpack(item):
+        return item if with_meta else (item, None)
+
+    def emit(out):
+        for i, (frame, (_, last_meta)) in enumerate(out):
+            if not with_meta:
+                yield frame
+                continue
+            if not resume_ids:
+                yield frame, last_meta
+                continue
+            # 未发送：合帧器缓冲 + 本批中排在后面的帧，按节点取最早的事件id
+            unsent = coalescer.pending_first()
+            for later, (first, _) in out[i + 1:]:
+                node = later.get("node", "")
+                unsent[node] = min(first, unsent.get(node, first))
+            yield frame, resume_id(pushed, unsent)
+
+    if not coalescer.enabled:
+        async for item in iterator:
+            envelope, meta = unpack(item)
+            pushed = meta if resume_ids else pushed
+            for out in emit([(envelope, (meta, meta))]):
+                yield out
+        return
+
+    # 单独的读取任务跨多个时间窗口存活，等待超时不会取消上游读取
+    getter: Optional[asyncio.Task] = None
+    try:
+        while True:
+            if getter is None:
+                getter = asyncio.ensure_future(iterator.__anext__())
+            timeout = None
+            if coalescer.deadline is not None:
+                timeout = max(0.0, coalescer.deadline - time.monotonic())
+            done, _ = await asyncio.wait({getter}, timeout=timeout)
+            if not done:
+                for out in emit(coalescer.flush()):
+                    yield out
+                continue
+            task, getter = getter, None
+            try:
+                item = task.result()
+            except StopAsyncIteration:
+                break
+            envelope, meta = unpack(item)
+            if resume_ids:
+                pushed = meta
+            for out in emit(coalescer.push(envelope, meta)):
+                yield out
+            if coalescer.deadline is not None and time.monotonic() >= coalescer.deadline:
+                for out in emit(coalescer.flush()):
+                    yield out
+        for out in emit(coalescer.flush()):
+            yield out
+    finally:
+        if getter is not None:
+            getter.cancel()
+            try:
+                await getter
+            except (asyncio.CancelledError, StopAsyncIteration, Exception):
+                pass
+
+
+def coalesce_params(coalesce_ms: Optional[int], coalesce_bytes: Optional[int]) -> Tuple[int, int]:
+    """解析客户端合帧参数，缺省时取服务端默认值"""
+    window_ms = COALESCE_MS if coalesce_ms is None else max(0, min(coalesce_ms, MAX_COALESCE_MS))
+    max_bytes = COALESCE_BYTES if coalesce_bytes is None else max(1, min(coalesce_bytes, MAX_COALESCE_BYTES))
+    return window_ms, max_bytes
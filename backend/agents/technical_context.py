@@ -0,0 +1,141 @@
+"""
+    结论节点技术面上下文：最近 N 个交易日的量价特征（涨跌方向、量能、K线形态）以数组运算一次算出，
+    渲染后的文本按 (股票代码, 最新交易日) 缓存，同一交易日内重复研究同一只股票不再查询和计算
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from databases.databases_connection import Session
+from databases.data_models import MarketPriceDaily
+from databases.ohlcv_store import ohlcv_store, ALL_FIELDS
+from databases.query_stats import query_source
+from utilities.basic_funcs import bare_code
+from utilities.lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+WINDOW = 20
+CACHE_SIZE = 1024
+
+# 量能、形态阈值，与原逐行判断口径一致
+VOL_SURGE = 150  # 成交量变化 > 150% 为放量
+VOL_SHRINK = -60  # 成交量变化 < -60% 为缩量
+LONG_BODY = 0.7  # 实体/振幅 > 0.7 为长实体
+DOJI_BODY = 0.2  # 实体/振幅 < 0.2 为十字星
+
+_cache: "OrderedDict[Tuple[str, str], Tuple[pd.DataFrame, str]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+@query_source
+def load_price_window(stock_code: str, window: int = WINDOW) -> pd.DataFrame:
+    """读取最近 window 个交易日日K，按日期降序；本地行情存储就绪时读取内存映射切片，否则查询数据库"""
+    if ohlcv_store.ready:
+        bars = ohlcv_store.tail(stock_code, window)
+        frame = pd.DataFrame(bars if bars is not None else {field: [] for field in ALL_FIELDS})
+        frame["trade_date"] = pd.to_datetime(frame["trade_date"])
+    else:
+        with Session() as session:
+            rows = session.query(MarketPriceDaily.trade_date, MarketPriceDaily.open, MarketPriceDaily.high,
+                                 MarketPriceDaily.low, MarketPriceDaily.close, MarketPriceDaily.vol,
+                                 MarketPriceDaily.amount
+                                 ).filter(
+                MarketPriceDaily.ticker == stock_code
+            ).order_by(MarketPriceDaily.trade_date.desc()).limit(window)
+            frame = pd.DataFrame(rows)
+    if frame.empty:
+        return pd.DataFrame(columns=list(ALL_FIELDS))
+    frame["trade_date"] = pd.to_datetime(frame["trade_date"])
+    return frame.sort_values(by="trade_date", ascending=False).reset_index(drop=True)
+
+
+def price_features(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    量价特征：涨跌幅、成交量变化、涨跌方向、量能描述、K线形态
+    涨跌幅与成交量变化沿用原口径，在按日期降序的序列上计算
+    """
+    out = frame.copy()
+    out["pct_change"] = out["close"].pct_change() * 100
+    out["vol_change"] = out["vol"].pct_change() * 100
+
+    pct = out["pct_change"].to_numpy(dtype=float)
+    vol_change = out["vol_change"].to_numpy(dtype=float)
+    out["direction"] = np.select([pct > 0, pct < 0], ["上涨", "下跌"], default="持平")
+    out["vol_desc"] = np.select(
+        [np.isnan(vol_change), vol_change > VOL_SURGE, vol_change < VOL_SHRINK],
+        ["", "放量", "缩量"], default="量能平稳"
+    )
+
+    open_p = out["open"].to_numpy(dtype=float)
+    close_p = out["close"].to_numpy(dtype=float)
+    candle_range = out["high"].to_numpy(dtype=float) - out["low"].to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        body_ratio = np.abs(close_p - open_p) / candle_range
+    out["shape"] = np.select(
+        [candle_range == 0, body_ratio > LONG_BODY, body_ratio < DOJI_BODY],
+        ["十字星", "长实体K线", "十字星"], default="中等实体K线"
+    )
+    return out
+
+
+def render_context(features: pd.DataFrame) -> str:
+    """特征表渲染为提示词文本，每个交易日一行"""
+    dates = features["trade_date"].dt.strftime("%Y-%m-%d").tolist()
+    columns = [features[c].tolist() for c in
+               ("open", "high", "low", "close", "vol", "amount", "pct_change", "direction", "vol_desc", "shape")]
+    lines = []
+    for i, (date, open_p, high_p, low_p, close_p, vol, amount, pct, direction, vol_desc, shape) in enumerate(
+            zip(dates, *columns)):
+        if pd.isna(pct):
+            # 无对比基准的交易日
+            desc = f"{date}：开盘 {open_p:.2f}，最高 {high_p:.2f}，最低 {low_p:.2f}，收盘 {close_p:.2f}，成交量 {vol:.2f}万，成交额 {amount:.0f}万。"
+            lines.append(f"0. {desc}（首个交易日数据，用于基准）")
+            continue
+        lines.append(
+            f"{i}. {date}：开盘 {open_p:.2f}，最高 {high_p:.2f}，最低 {low_p:.2f}，收盘 {close_p:.2f}，"
+            f"{direction} {pct:+.2f}%，{vol_desc}（成交量 {vol:.2f}万，成交额 {amount:.0f}万），"
+            f"形成{shape}。"
+        )
+    return "\n".join(lines)
+
+
+def _latest_trade_date(stock_code: str) -> Optional[str]:
+    """本地行情存储中的最新交易日，用于在计算前命中缓存"""
+    if not ohlcv_store.ready:
+        return None
+    bars = ohlcv_store.tail(stock_code, 1)
+    if bars is None or len(bars["trade_date"]) == 0:
+        return None
+    return str(bars["trade_date"][-1])
+
+
+def technical_context(stock_code: str) -> Tuple[pd.DataFrame, str]:
+    """
+    获取技术面特征及提示词文本（带缓存）
+    :param stock_code: 股票代码，可带交易所后缀
+    :return: (特征表, 提示词文本)
+    """
+    stock_code = bare_code(stock_code)
+    latest = _latest_trade_date(stock_code)
+    if latest is not None:
+        with _cache_lock:
+            cached = _cache.get((stock_code, latest))
+            if cached is not None:
+                _cache.move_to_end((stock_code, latest))
+                return cached
+
+    frame = load_price_window(stock_code)
+    features = price_features(frame)
+    result = (features, render_context(features))
+    if not frame.empty:
+        key = (stock_code, str(frame["trade_date"].iloc[0].date()))
+        with _cache_lock:
+            _cache[key] = result
+            _cache.move_to_end(key)
+            while len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+    return result
@@ -0,0 +1,365 @@
+"""
+    智能体SSE负载测试：N 个并发客户端订阅 /agents_sse/multiagents/fundamental，统计首帧耗时（TTFB）、首个输出token耗时、
+    帧间隔分位数（事件循环阻塞会体现为长间隔）、吞吐及服务进程CPU/内存，结果连同 git 提交号写入 JSON
+    默认启动一个使用离线替身（agents.fake_provider）的 uvicorn 子进程，不访问真实供应商；也可压测已启动的服务
+    用法（在 backend 目录下）：
+        python -m benchmarks.agents_sse --clients 20 --tokens-per-second 60 --unthrottled
+        python -m benchmarks.agents_sse --clients 50 --stocks 10          # 每只股票5个客户端共享同一条流水线
+        python -m benchmarks.agents_sse --error-rate 0.1 --recordings /path/to/recordings
+        python -m benchmarks.agents_sse --base-url http://127.0.0.1:8000 --server-pid 12345
+        python -m benchmarks.agents_sse --strategies-load 16 --strategies-rps 50 --check-p99  # 对比有无 /strategies 并发请求时的p99，超出容差时返回码为1
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+import numpy as np
+from sqlalchemy import text
+
+from benchmarks.endpoints import BACKEND_DIR, ENDPOINTS, RESULTS_DIR, Dataset, git_commit, percentile_summary, \
+    process_memory
+from databases.databases_connection import engine
+from utilities.result_builder import loads
+
+SSE_PATH = "/agents_sse/multiagents/fundamental"
+PROVIDERS = ("doubao", "kimi", "gpt")
+# 命令行参数 -> 替身环境变量
+FAKE_OPTIONS = {
+    "first_token_ms": "LLM_FAKE_FIRST_TOKEN_MS",
+    "tokens_per_second": "LLM_FAKE_TOKENS_PER_SECOND",
+    "thinking_tokens": "LLM_FAKE_THINKING_TOKENS",
+    "output_tokens": "LLM_FAKE_OUTPUT_TOKENS",
+    "error_rate": "LLM_FAKE_ERROR_RATE",
+    "tool_call_ms": "LLM_FAKE_TOOL_CALL_MS",
+    "recordings": "LLM_FAKE_RECORDINGS",
+}
+
+
+class ServerMonitor:
+    """按间隔采样服务进程的CPU时间与RSS"""
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.ticks = os.sysconf("SC_CLK_TCK")
+        self.rss: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+        self._cpu_start = self._started = 0.0
+
+    def cpu_seconds(self) -> float:
+        with open(f"/proc/{self.pid}/stat", "r", encoding="utf-8") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self.ticks  # utime + stime
+
+    async def _sample(self):
+        while True:
+            self.rss.append(process_memory(self.pid).get("rssMb", 0.0))
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._cpu_start, self._started = self.cpu_seconds(), time.perf_counter()
+        self._task = asyncio.create_task(self._sample())
+
+    async def stop(self) -> Dict[str, Any]:
+        cpu, wall = self.cpu_seconds() - self._cpu_start, time.perf_counter() - self._started
+        self._task.cancel()  # type: ignore
+        await asyncio.gather(self._task, return_exceptions=True)  # type: ignore
+        memory = process_memory(self.pid)
+        return {"cpuSeconds": round(cpu, 2), "cpuPercent": round(cpu / wall * 100, 1) if wall else 0.0,
+                "rssMeanMb": round(float(np.mean(self.rss)), 1) if self.rss else None, **memory}
+
+
+async def sse_client(client: httpx.AsyncClient, params: Dict[str, str], delay: float) -> Dict[str, Any]:
+    """单个SSE客户端：读取到结束事件为止，记录各帧到达时间"""
+    await asyncio.sleep(delay)
+    result: Dict[str, Any] = {"code": params["stockCode"], "status": None, "ttfb": None, "ttft": None,
+                              "frames": 0, "bytes": 0, "chars": 0, "gaps": [], "errors": 0, "completed": False}
+    started = time.perf_counter()
+    last = None
+    try:
+        async with client.stream("GET", SSE_PATH, params=params) as response:
+            result["status"] = response.status_code
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                now = time.perf_counter()
+                result["frames"] += 1
+                result["bytes"] += len(line)
+                if result["ttfb"] is None:
+                    result["ttfb"] = now - started
+                if last is not None:
+                    result["gaps"].append(now - last)
+                last = now
+                envelope = loads(line[5:])
+                data = envelope.get("data")
+                if isinstance(data, dict):
+                    if data.get("phase") == "error":
+                        result["errors"] += 1
+                    if data.get("phase") in ("thinking", "output") and isinstance(data.get("content"), str):
+                        result["chars"] += len(data["content"])
+                        if result["ttft"] is None and data["phase"] == "output":
+                            result["ttft"] = now - started
+                if envelope.get("node") == "" and envelope.get("state") == "done" and "data" not in envelope:
+                    result["completed"] = True
+    except Exception as e:
+        result["exception"] = type(e).__name__
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+def summarize(clients: List[Dict[str, Any]], wall: float) -> Dict[str, Any]:
+    def collect(field: str) -> List[float]:
+        return [c[field] for c in clients if c[field] is not None]
+
+    gaps = [gap for c in clients for gap in c["gaps"]]
+    frames = sum(c["frames"] for c in clients)
+    return {
+        "clients": len(clients),
+        "completed": sum(c["completed"] for c in clients),
+        "withErrorEvents": sum(1 for c in clients if c["errors"]),
+        "exceptions": sum(1 for c in clients if "exception" in c),
+        "seconds": round(wall, 3),
+        "framesPerSecond": round(frames / wall, 1) if wall else 0.0,
+        "charsPerSecond": round(sum(c["chars"] for c in clients) / wall, 1) if wall else 0.0,
+        "bytesPerSecond": round(sum(c["bytes"] for c in clients) / wall, 1) if wall else 0.0,
+        "ttfbMs": percentile_summary(collect("ttfb")),
+        "ttftMs": percentile_summary(collect("ttft")),
+        "durationMs": percentile_summary(collect("seconds")),
+        "frameGapMs": percentile_summary(gaps),
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def server_env(args) -> Dict[str, str]:
+    """子进程环境：启用替身，按参数设置替身行为，--unthrottled 时放开治理器限额"""
+    env = dict(os.environ, LLM_FAKE_PROVIDERS=args.providers)
+    for option, name in FAKE_OPTIONS.items():
+        value = getattr(args, option)
+        if value is not None:
+            env[name] = str(value)
+    if args.unthrottled:
+        for provider in PROVIDERS:
+            for name, value in (("RPS", 10000), ("BURST", 10000), ("CONCURRENCY", 10000), ("QUEUE", 10000)):
+                env[f"LLM_{provider.upper()}_{name}"] = str(value)
+    return env
+
+
+async def wait_ready(client: httpx.AsyncClient, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"服务进程已退出，返回码 {process.returncode}")
+        try:
+            if (await client.get("/strategies/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.3)
+    raise SystemExit("服务启动超时")
+
+
+def pick_stocks(count: int, seed: int) -> List[str]:
+    with engine.connect() as conn:
+        codes = [row[0] for row in conn.execute(text("SELECT ticker FROM quant_research.basic_info_stock ORDER BY 1"))]
+    if not codes:
+        raise SystemExit("基准库为空，先运行 python -m benchmarks.generate_market")
+    rng = np.random.default_rng(seed)
+    return list(rng.choice(codes, count, replace=count > len(codes)))
+
+
+async def run_clients(client: httpx.AsyncClient, args, report_date: str) -> Dict[str, Any]:
+    codes = pick_stocks(args.stocks or args.clients, args.seed)
+    requests = [{"stockCode": codes[i % len(codes)], "reportDate": report_date,
+                 "userInput": f"请分析{codes[i % len(codes)]}的基本面情况"} for i in range(args.clients)]
+    if args.coalesce_ms is not None:
+        for params in requests:
+            params["coalesceMs"] = str(args.coalesce_ms)
+    started = time.perf_counter()
+    clients = await asyncio.gather(*(
+        sse_client(client, params, args.ramp_seconds * i / max(args.clients - 1, 1))
+        for i, params in enumerate(requests)))
+    summary = summarize(clients, time.perf_counter() - started)
+    statuses: Dict[str, int] = {}
+    for c in clients:
+        statuses[str(c["status"])] = statuses.get(str(c["status"]), 0) + 1
+    summary["statuses"] = statuses
+    return summary
+
+
+async def strategies_load(client: httpx.AsyncClient, concurrency: int, rps: float, stop: asyncio.Event, seed: int
+                          ) -> Dict[str, Any]:
+    """
+    后台 /strategies 请求，随机轮换四个接口，直到 stop 被设置
+    rps > 0 时按固定速率发起（模拟看板流量，最多 concurrency 个在途请求）；rps 为 0 时 concurrency 个请求背靠背发起（压满服务）
+    """
+    dataset = Dataset(np.random.default_rng(seed))
+    names = list(ENDPOINTS)
+    latencies: List[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal errors
+        method, path, sample = ENDPOINTS[dataset.pick(names)]
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, json=sample(dataset) if sample is not None else None)
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+        except httpx.HTTPError:
+            errors += 1
+        finally:
+            semaphore.release()
+
+    started = time.perf_counter()
+    next_at = started
+    tasks = set()
+    while not stop.is_set():
+        await semaphore.acquire()
+        task = asyncio.create_task(one())
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        if rps > 0:
+            next_at += 1 / rps
+            await asyncio.sleep(max(next_at - time.perf_counter(), 0))
+    await asyncio.gather(*tasks)
+    wall = time.perf_counter() - started
+    return {"concurrency": concurrency, "targetRps": rps, "requests": len(latencies), "errors": errors,
+            "throughputRps": round(len(latencies) / wall, 1) if wall else 0.0,
+            "latencyMs": percentile_summary(latencies)}
+
+
+async def run_with_load(client: httpx.AsyncClient, args, report_date: str) -> Dict[str, Any]:
+    """SSE客户端运行期间并发发起 /strategies 请求"""
+    stop = asyncio.Event()
+    load = asyncio.create_task(strategies_load(client, args.strategies_load, args.strategies_rps, stop,
+                                              args.seed))
+    try:
+        summary = await run_clients(client, args, report_date)
+    finally:
+        stop.set()
+    summary["strategies"] = await load
+    return summary
+
+
+def compare_p99(baseline: Dict[str, Any], loaded: Dict[str, Any], tolerance: float, slack_ms: float
+                ) -> Dict[str, Any]:
+    """有负载时的 p99（TTFB、帧间隔）不超过 基线 × (1 + tolerance) + slack_ms 视为不受影响"""
+    checks = {}
+    for metric in ("ttfbMs", "frameGapMs"):
+        base, value = baseline[metric].get("p99"), loaded[metric].get("p99")
+        limit = round(base * (1 + tolerance) + slack_ms, 2) if base is not None else None
+        checks[metric] = {"baselineP99": base, "loadedP99": value, "limit": limit,
+                          "passed": value is not None and limit is not None and value <= limit}
+    return {"tolerance": tolerance, "slackMs": slack_ms, "metrics": checks,
+            "passed": all(check["passed"] for check in checks.values())}
+
+
+def random_report_date(rng: np.random.Generator) -> str:
+    """随机历史日期作为报告期，避免命中已持久化结果，每个客户端都走完整流水线"""
+    return str(datetime.date(2000, 1, 1) + datetime.timedelta(days=int(rng.integers(0, 7000))))
+
+
+async def run(args) -> Dict[str, Any]:
+    rng = np.random.default_rng()
+    report_date = args.report_date or random_report_date(rng)
+    result: Dict[str, Any] = {
+        **git_commit(),
+        "startedAt": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "args": vars(args),
+        "reportDate": report_date,
+    }
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    timeout = httpx.Timeout(args.timeout)
+    limits = httpx.Limits(max_connections=args.clients + args.strategies_load + 10)
+    process = None
+    base_url, pid = args.base_url, args.server_pid
+    if base_url is None:
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        process = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+                                    "--log-level", "warning"], cwd=BACKEND_DIR, env=server_env(args))
+        pid = process.pid
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+            if process is not None:
+                await wait_ready(client, process)
+            monitor = ServerMonitor(pid) if pid else None
+            if monitor is not None:
+                monitor.start()
+            if args.check_p99:
+                # 先测无负载基线（另取报告期，两轮都走完整流水线）
+                result["baseline"] = await run_clients(client, args, random_report_date(rng))
+            if args.strategies_load:
+                result["sse"] = await run_with_load(client, args, report_date)
+            else:
+                result["sse"] = await run_clients(client, args, report_date)
+            if args.check_p99:
+                result["check"] = compare_p99(result["baseline"], result["sse"], args.tolerance, args.slack_ms)
+            if monitor is not None:
+                result["server"] = await monitor.stop()
+            result["providers"] = (await client.get("/agents_sse/multiagents/providers")).json()
+            result["runs"] = (await client.get("/agents_sse/multiagents/runs")).json()
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="智能体SSE负载测试")
+    parser.add_argument("--clients", type=int, default=20, help="并发SSE客户端数")
+    parser.add_argument("--stocks", type=int, default=None, help="不同股票数，小于客户端数时多个客户端共享流水线")
+    parser.add_argument("--ramp-seconds", type=float, default=0, help="客户端在该时间内均匀启动")
+    parser.add_argument("--report-date", default=None, help="报告期，默认每次运行随机取历史日期")
+    parser.add_argument("--coalesce-ms", type=int, default=None, help="合帧时间窗口（毫秒），默认使用服务端配置")
+    parser.add_argument("--providers", default="all", help="启用替身的供应商（子进程模式）")
+    parser.add_argument("--first-token-ms", type=float, default=None)
+    parser.add_argument("--tokens-per-second", type=float, default=None)
+    parser.add_argument("--thinking-tokens", type=int, default=None)
+    parser.add_argument("--output-tokens", type=int, default=None)
+    parser.add_argument("--error-rate", type=float, default=None, help="每条流注入错误的概率")
+    parser.add_argument("--tool-call-ms", type=float, default=None, help="KIMI检索往返耗时（毫秒）")
+    parser.add_argument("--recordings", default=None, help="录制事件目录，存在对应节点文件时回放录制序列")
+    parser.add_argument("--unthrottled", action="store_true", help="放开供应商治理器限额（子进程模式）")
+    parser.add_argument("--strategies-load", type=int, default=0, help="SSE运行期间 /strategies 最大在途请求数，0 表示不加负载")
+    parser.add_argument("--strategies-rps", type=float, default=50, help="/strategies 请求速率，0 表示背靠背压满")
+    parser.add_argument("--check-p99", action="store_true", help="先跑无负载基线，再对比有负载时的p99")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="p99 相对基线的允许增幅")
+    parser.add_argument("--slack-ms", type=float, default=10, help="p99 允许的绝对增量（毫秒）")
+    parser.add_argument("--base-url", default=None, help="压测已启动的服务，为空时启动替身服务子进程")
+    parser.add_argument("--server-pid", type=int, default=None, help="压测已启动的服务时采样该进程的CPU/内存")
+    parser.add_argument("--timeout", type=float, default=600, help="单个客户端超时（秒）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="结果JSON路径，默认 benchmarks/results/agents-sse-<提交>-<时间>.json")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    print(json.dumps({key: result[key] for key in ("baseline", "sse", "server", "check") if key in result},
+                     ensure_ascii=False, indent=2))
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"agents-sse-{(result['commit'] or 'unknown')[:10]}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {output}")
+    if result.get("check", {}).get("passed") is False:
+        sys.exit(1)
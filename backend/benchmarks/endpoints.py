@@ -0,0 +1,253 @@
+"""
+    策略/行情接口基准：按设定并发对 getStrategyResults、getStrategyFilters、getStockPrice、strategyAggregation
+    发起请求，统计延迟分位数、吞吐、错误数及内存（RSS、可选 tracemalloc），结果连同 git 提交号写入 JSON，便于跨提交对比
+    数据先由 benchmarks.generate_market 生成；默认在进程内经 ASGI 调用 main.app（含启动流程），也可压测已启动的服务
+    用法（在 backend 目录下）：
+        python -m benchmarks.endpoints --concurrency 1,8,32 --requests 400
+        python -m benchmarks.endpoints --endpoints getStockPrice --cold         # 每次请求前清空策略结果缓存
+        python -m benchmarks.endpoints --base-url http://127.0.0.1:8000 --server-pid 12345
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+import numpy as np
+from sqlalchemy import text
+
+from databases.databases_connection import engine
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+
+class Dataset:
+    """请求参数取样：报告期、强势股日期周期、股票代码均取自基准库"""
+
+    def __init__(self, rng: np.random.Generator):
+        self.rng = rng
+        with engine.connect() as conn:
+            self.codes = [row[0] for row in conn.execute(text("SELECT ticker FROM quant_research.basic_info_stock"))]
+            self.report_dates = [str(row[0]) for row in conn.execute(text(
+                "SELECT DISTINCT end_date FROM quant_research.strategy_divquality ORDER BY end_date DESC"))]
+            self.max_trade_date = conn.execute(text("SELECT MAX(trade_date) FROM quant_research.platform_stock_daily")
+                                               ).scalar()
+            self.market_rows = conn.execute(text(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = 'quant_research.market_daily_ts'::regclass")
+            ).scalar()
+        if not self.codes or not self.report_dates:
+            raise SystemExit("基准库为空，先运行 python -m benchmarks.generate_market")
+
+    def pick(self, items: List[Any]) -> Any:
+        return items[self.rng.integers(0, len(items))]
+
+    def strategy_results(self) -> Dict[str, Any]:
+        strategy_id = self.pick([0, 1, 3])
+        if strategy_id == 3:
+            return {"strategyId": 3, "datePeriod": self.pick([3, 5, 10, 20]), "stage": self.pick([1, 2])}
+        # 报告期集中在最近几期，与前端访问分布相近
+        recent = self.report_dates[:min(len(self.report_dates), 8)]
+        return {"strategyId": strategy_id, "reportDate": self.pick(recent)}
+
+    def strategy_filters(self) -> Dict[str, Any]:
+        return {"strategyId": self.pick([0, 1, 3])}
+
+    def stock_price(self) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {"stockCode": self.pick(self.codes)}
+        kind = self.rng.integers(0, 3)
+        if kind == 1:  # 近一年
+            payload["startDate"] = str(self.max_trade_date - datetime.timedelta(days=365))
+        elif kind == 2:  # 全量降采样
+            payload["maxPoints"] = 500
+        return payload
+
+    def describe(self) -> Dict[str, Any]:
+        return {"tickers": len(self.codes), "reportDates": len(self.report_dates),
+                "maxTradeDate": str(self.max_trade_date), "marketRowsEstimate": self.market_rows}
+
+
+# 接口名 -> (方法, 路径, 请求体取样)
+ENDPOINTS: Dict[str, tuple] = {
+    "getStrategyResults": ("POST", "/strategies/getStrategyResults", Dataset.strategy_results),
+    "getStrategyFilters": ("POST", "/strategies/getStrategyFilters", Dataset.strategy_filters),
+    "getStockPrice": ("POST", "/strategies/getStockPrice", Dataset.stock_price),
+    "strategyAggregation": ("GET", "/strategies/strategyAggregation", None),
+}
+
+
+def percentile_summary(latencies: List[float]) -> Dict[str, float]:
+    if not latencies:
+        return {}
+    values = np.array(latencies) * 1000
+    return {"p50": round(float(np.percentile(values, 50)), 2), "p90": round(float(np.percentile(values, 90)), 2),
+            "p99": round(float(np.percentile(values, 99)), 2), "max": round(float(values.max()), 2),
+            "mean": round(float(values.mean()), 2)}
+
+
+def process_memory(pid: Optional[int] = None) -> Dict[str, float]:
+    """RSS 与峰值 RSS（MB），pid 为空时取当前进程"""
+    try:
+        with open(f"/proc/{pid or 'self'}/status", "r", encoding="utf-8") as f:
+            fields = dict(line.split(":", 1) for line in f if line.startswith(("VmRSS", "VmHWM")))
+        return {"rssMb": round(int(fields["VmRSS"].split()[0]) / 1024, 1),
+                "peakRssMb": round(int(fields["VmHWM"].split()[0]) / 1024, 1)}
+    except (OSError, KeyError):
+        if pid is not None:
+            return {}
+        # 非 Linux 环境只有峰值（macOS 单位为字节）
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {"peakRssMb": round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)}
+
+
+async def run_endpoint(client: httpx.AsyncClient, dataset: Dataset, name: str, concurrency: int, total: int,
+                       before_request: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+    """concurrency 个工作协程共同完成 total 次请求"""
+    method, path, sample = ENDPOINTS[name]
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    sent = 0
+    response_bytes = 0
+
+    async def worker():
+        nonlocal sent, response_bytes
+        while sent < total:
+            sent += 1
+            payload = sample(dataset) if sample is not None else None
+            if before_request is not None:
+                before_request()
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=payload)
+                elapsed = time.perf_counter() - started
+                if response.status_code == 200:
+                    latencies.append(elapsed)
+                    response_bytes += len(response.content)
+                else:
+                    errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+            except Exception as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    return {
+        "endpoint": name,
+        "concurrency": concurrency,
+        "requests": total,
+        "ok": len(latencies),
+        "errors": errors,
+        "seconds": round(wall, 3),
+        "throughputRps": round(len(latencies) / wall, 1) if wall else 0.0,
+        "latencyMs": percentile_summary(latencies),
+        "avgResponseBytes": round(response_bytes / len(latencies)) if latencies else 0,
+    }
+
+
+def git_commit() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BACKEND_DIR,
+                                    capture_output=True, text=True).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+async def wait_store_ready(timeout: float) -> bool:
+    """等待本地行情存储就绪（首次启动时后台全量构建），超时后 getStockPrice 走数据库"""
+    from databases.ohlcv_store import ohlcv_store
+    deadline = time.monotonic() + timeout
+    while not ohlcv_store.ready and time.monotonic() < deadline:
+        await asyncio.sleep(0.5)
+    return ohlcv_store.ready
+
+
+async def run(args) -> Dict[str, Any]:
+    dataset = Dataset(np.random.default_rng(args.seed))
+    levels = [int(level) for level in args.concurrency.split(",")]
+    names = list(ENDPOINTS) if args.endpoints == "all" else args.endpoints.split(",")
+    result: Dict[str, Any] = {
+        **git_commit(),
+        "startedAt": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "args": vars(args),
+        "dataset": dataset.describe(),
+        "results": [],
+    }
+
+    async def measure(client: httpx.AsyncClient, before_request: Optional[Callable[[], None]] = None):
+        for name in names:
+            if args.warmup:
+                await run_endpoint(client, dataset, name, 1, args.warmup)
+            for level in levels:
+                if args.tracemalloc:
+                    tracemalloc.reset_peak()
+                item = await run_endpoint(client, dataset, name, level, args.requests, before_request)
+                # 压测外部服务且未给出进程号时不记录内存（本进程只是客户端）
+                item["memory"] = process_memory(args.server_pid) if args.server_pid or not args.base_url else {}
+                if args.tracemalloc:
+                    item["memory"]["tracedPeakMb"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+                result["results"].append(item)
+                print(f"{name} 并发{level}：{item['throughputRps']} req/s，p50 {item['latencyMs'].get('p50')}ms，"
+                      f"p99 {item['latencyMs'].get('p99')}ms，错误 {sum(item['errors'].values())}", flush=True)
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # 不逐条输出请求日志
+    timeout = httpx.Timeout(args.timeout)
+    if args.base_url:
+        result["mode"] = "http"
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=timeout) as client:
+            await measure(client)
+        return result
+
+    # 进程内：经 ASGI 调用完整应用（含启动、关闭流程）
+    from main import app
+    from strategy_management.cache import strategy_cache
+    result["mode"] = "asgi"
+    if args.tracemalloc:
+        tracemalloc.start()
+    async with app.router.lifespan_context(app):
+        result["priceSource"] = "store" if await wait_store_ready(args.store_timeout) else "database"
+        result["memoryBefore"] = process_memory()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=timeout) as client:
+            await measure(client, strategy_cache.invalidate if args.cold else None)
+        result["cache"] = strategy_cache.stats()
+    if args.tracemalloc:
+        tracemalloc.stop()
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="策略/行情接口基准")
+    parser.add_argument("--endpoints", default="all", help="逗号分隔的接口名，或 all：" + ",".join(ENDPOINTS))
+    parser.add_argument("--concurrency", default="1,8,32", help="逗号分隔的并发数")
+    parser.add_argument("--requests", type=int, default=200, help="每个接口、每档并发的请求数")
+    parser.add_argument("--warmup", type=int, default=10, help="每个接口正式计时前的预热请求数")
+    parser.add_argument("--cold", action="store_true", help="每次请求前清空策略结果缓存（仅进程内模式）")
+    parser.add_argument("--tracemalloc", action="store_true", help="统计Python堆分配峰值（有额外开销，仅进程内模式）")
+    parser.add_argument("--base-url", default=None, help="压测已启动的服务，为空时进程内调用 main.app")
+    parser.add_argument("--server-pid", type=int, default=None, help="压测已启动的服务时读取该进程的内存")
+    parser.add_argument("--store-timeout", type=float, default=600, help="等待本地行情存储就绪的最长时间（秒）")
+    parser.add_argument("--timeout", type=float, default=60, help="单次请求超时（秒）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="结果JSON路径，默认 benchmarks/results/endpoints-<提交>-<时间>.json")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"endpoints-{(result['commit'] or 'unknown')[:10]}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {output}")
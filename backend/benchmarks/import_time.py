@@ -0,0 +1,87 @@
+"""
+    启动导入耗时预算检查：在子进程中以 python -X importtime 导入 main 若干次，取 main 累计导入耗时的最小值，
+    超出预算或重量级依赖（pandas、numpy、供应商 SDK、httpx）在导入期被加载时以退出码 1 失败，便于发现启动回退
+    用法（在 backend 目录下）：
+        python -m benchmarks.import_time --budget-ms 600
+        python -m benchmarks.import_time --runs 5 --top 15 --output /tmp/import_time.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+from benchmarks.endpoints import BACKEND_DIR, git_commit
+
+# 只在请求处理路径上使用、应延迟导入的模块
+FORBIDDEN_MODULES = ["pandas", "numpy", "openai", "volcenginesdkarkruntime", "httpx"]
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def measure_once(target: str) -> Dict[str, Any]:
+    """导入一次 target，返回各模块 (自身耗时, 累计耗时) 微秒"""
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {target}"], cwd=BACKEND_DIR,
+                               capture_output=True, text=True, env=env)
+    if completed.returncode != 0:
+        raise SystemExit(f"导入 {target} 失败：\n{completed.stderr[-2000:]}")
+    modules: Dict[str, Dict[str, int]] = {}
+    for line in completed.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            modules[match.group(4)] = {"self": int(match.group(1)), "cumulative": int(match.group(2)),
+                                       "depth": len(match.group(3)) // 2}
+    if target not in modules:
+        raise SystemExit(f"未解析到 {target} 的导入耗时")
+    return modules
+
+
+def run(args) -> Dict[str, Any]:
+    runs: List[Dict[str, Dict[str, int]]] = [measure_once(args.target) for _ in range(args.runs)]
+    totals = [modules[args.target]["cumulative"] for modules in runs]
+    best = runs[totals.index(min(totals))]
+    # 目标模块直接依赖中累计耗时最高者（depth 为 1 的模块即顶层导入）
+    top = sorted(((name, item["cumulative"]) for name, item in best.items()
+                  if item["depth"] <= 1 and name != args.target), key=lambda pair: pair[1], reverse=True)[:args.top]
+    eager = [name for name in FORBIDDEN_MODULES if name in best]
+    total_ms = round(min(totals) / 1000, 1)
+    return {
+        **git_commit(),
+        "startedAt": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "target": args.target,
+        "runsMs": [round(total / 1000, 1) for total in totals],
+        "importMs": total_ms,
+        "budgetMs": args.budget_ms,
+        "topModulesMs": {name: round(cumulative / 1000, 1) for name, cumulative in top},
+        "eagerForbidden": eager,
+        "passed": total_ms <= args.budget_ms and not eager,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="启动导入耗时预算检查")
+    parser.add_argument("--target", default="main", help="导入的模块")
+    parser.add_argument("--runs", type=int, default=5, help="导入次数，取最小值以排除磁盘缓存等干扰")
+    parser.add_argument("--budget-ms", type=float, default=600, help="累计导入耗时预算（毫秒）")
+    parser.add_argument("--top", type=int, default=10, help="输出累计耗时最高的顶层导入数")
+    parser.add_argument("--output", default=None, help="结果JSON路径，为空时只打印")
+    args = parser.parse_args()
+
+    result = run(args)
+    for name, ms in result["topModulesMs"].items():
+        print(f"{ms:>8.1f}ms  {name}")
+    print(f"{args.target} 导入耗时 {result['importMs']}ms（各次 {result['runsMs']}），预算 {args.budget_ms}ms")
+    if result["eagerForbidden"]:
+        print(f"导入期加载了应延迟导入的模块：{', '.join(result['eagerForbidden'])}")
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.output}")
+    sys.exit(0 if result["passed"] else 1)
@@ -0,0 +1,119 @@
+"""
+    合流吞吐基准：模拟若干节点按固定速率输出token，测量 MultiAgents.merge_stream 的输出吞吐与逐token延迟
+    用法（在 backend 目录下）：
+        python -m benchmarks.merge_stream --nodes 3 --rate 5000 --seconds 2
+        python -m benchmarks.merge_stream --legacy      # 对比原实现（每条事件检查断开并休眠10ms）
+        python -m benchmarks.merge_stream --coalesce-ms 50 --coalesce-bytes 2048   # 合流后再合帧，统计SSE帧数与字节数
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from agents.async_model_calls import FairQueue, MultiAgents
+from agents.sse import coalesce, format_event
+
+
+class IdleRequest:
+    """不会断开的客户端请求"""
+
+    async def receive(self):
+        await asyncio.Event().wait()
+
+    async def is_disconnected(self) -> bool:
+        return False
+
+
+async def fake_node(rate: int, seconds: float, node: str = ""):
+    """按 rate token/秒 输出事件信封，事件循环每次唤醒补齐应输出的token"""
+    total = int(rate * seconds)
+    emitted = 0
+    start = time.perf_counter()
+    while emitted < total:
+        due = min(total, int((time.perf_counter() - start) * rate) + 1)
+        while emitted < due:
+            yield {"node": node, "state": "in_progress",
+                   "data": {"phase": "output", "content": "字", "annotation": {}, "model": "fake", "id": "",
+                            "index": emitted, "producedAt": time.perf_counter()}}
+            emitted += 1
+        await asyncio.sleep(0.001)
+
+
+class LegacyAgents(MultiAgents):
+    """原合流实现：每条事件前检查断开，输出后固定休眠10ms"""
+
+    async def merge_stream(self, request, queue, nodes_total: int):
+        ended = set()
+        while True:
+            if await request.is_disconnected():
+                break
+            item = await queue.get()
+            if item["type"] == "data":
+                yield item["text"]
+            elif item["type"] == "end":
+                ended.add(item["node"])
+                if len(ended) == nodes_total:
+                    break
+            await asyncio.sleep(0.01)
+
+
+async def run(nodes: int, rate: int, seconds: float, quantum: int, legacy: bool, cap: float,
+              coalesce_ms: int = 0, coalesce_bytes: int = 2048):
+    agent = LegacyAgents() if legacy else MultiAgents()
+    queue = asyncio.Queue() if legacy else FairQueue(quantum=quantum)
+    tasks = [asyncio.create_task(agent.reader_task(f"node_{i}", fake_node(rate, seconds, f"node_{i}"), queue))
+             for i in range(nodes)]
+    latencies = []
+    frames = 0
+    frame_bytes = 0
+    start = time.perf_counter()
+    stream = agent.merge_stream(IdleRequest(), queue, nodes)
+    async for envelope in coalesce(stream, coalesce_ms, coalesce_bytes):
+        now = time.perf_counter()
+        frame = format_event(envelope)
+        frames += 1
+        frame_bytes += len(frame.encode("utf-8"))
+        # 合并帧按其中最后一个token计算延迟，帧内token数按内容长度计
+        latencies.extend([now - envelope["data"]["producedAt"]] * len(envelope["data"]["content"]))
+        if now - start > cap:
+            break
+    elapsed = time.perf_counter() - start
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "impl": "legacy" if legacy else "fair",
+        "coalesceMs": coalesce_ms,
+        "frames": frames,
+        "frameBytes": frame_bytes,
+        "nodes": nodes,
+        "ratePerNode": rate,
+        "offered": nodes * rate,
+        "delivered": len(latencies),
+        "expected": int(nodes * rate * seconds),
+        "elapsedSec": round(elapsed, 3),
+        "throughput": round(len(latencies) / elapsed, 1),
+        "latencyMs": {p: round(float(np.percentile(latencies_ms, q)), 3)
+                      for p, q in (("p50", 50), ("p99", 99), ("max", 100))} if len(latencies) else {},
+        "keptUp": len(latencies) >= int(nodes * rate * seconds) and elapsed < seconds * 1.2,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="merge_stream 吞吐基准")
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--rate", type=int, default=5000, help="每个节点每秒输出token数")
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--quantum", type=int, default=8)
+    parser.add_argument("--legacy", action="store_true")
+    parser.add_argument("--cap", type=float, default=10.0, help="最长运行时间（秒）")
+    parser.add_argument("--coalesce-ms", type=int, default=0, help="合帧时间窗口（毫秒），0 表示不合帧")
+    parser.add_argument("--coalesce-bytes", type=int, default=2048, help="合帧字节阈值")
+    args = parser.parse_args()
+    result = asyncio.run(run(args.nodes, args.rate, args.seconds, args.quantum, args.legacy, args.cap,
+                             args.coalesce_ms, args.coalesce_bytes))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
@@ -0,0 +1,166 @@
+"""
+    最新指标快照：platform_stock_daily（每只股票一行，每日更新一次）常驻进程内存，按代码有序的列式数组存储，
+    策略查询只取自身的 (代码, 信号, 日期) 行，简称、行业、总市值、涨跌幅由内存按代码批量取值补齐，不再逐次联表
+    启动时加载；后台按间隔探测数据版本（最大交易日 + 写入计数，同 strategy_management/cache.py），变化时整体重新加载。
+    加载或探测失败时保留当前快照继续服务，快照表维护期间策略接口照常可用
+"""
+from __future__ import annotations
+
+import asyncio
+import datetime
+import logging
+import os
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import text
+
+from databases.databases_connection import async_engine
+from databases.query_stats import query_source
+from utilities.basic_funcs import bare_codes, code_positions
+from utilities.lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+logger = logging.getLogger(__name__)
+
+# 快照字段 -> 缺失值（代码不在快照中时取该值）
+SNAPSHOT_FIELDS = {
+    "short_name": None,
+    "industry_name": None,
+    "total_mv": float("nan"),
+    "change_pct": float("nan"),
+    "close": float("nan"),
+}
+REFRESH_INTERVAL = int(os.getenv("LATEST_SNAPSHOT_REFRESH_INTERVAL", "60"))  # 秒
+
+_LOAD_SQL = f"""
+    SELECT code, trade_date, {", ".join(SNAPSHOT_FIELDS)}
+    FROM quant_research.platform_stock_daily
+"""
+# 最大交易日走 idx_platform_stock_daily_trade_date（databases/migrations/001_strategy_date_indexes.sql）
+_PROBE_SQL = """
+    SELECT (SELECT MAX(trade_date) FROM quant_research.platform_stock_daily) AS max_date,
+           (SELECT n_tup_ins + n_tup_upd + n_tup_del FROM pg_stat_user_tables
+            WHERE schemaname = 'quant_research' AND relname = 'platform_stock_daily') AS changes
+"""
+
+
+class _Columns:
+    """某一版本的快照：codes 升序，各字段数组末尾多一个缺失值，下标 -1 即取到缺失值"""
+
+    def __init__(self, version: Tuple, codes: np.ndarray, fields: Dict[str, np.ndarray]):
+        self.version = version
+        self.codes = codes
+        self.fields = fields
+
+    def positions(self, codes) -> np.ndarray:
+        """批量定位代码（6位或带后缀），不在快照中的代码为 -1"""
+        return code_positions(self.codes, bare_codes(codes))
+
+
+class LatestSnapshot:
+    """platform_stock_daily 的进程内列式快照"""
+
+    def __init__(self):
+        self._columns: Optional[_Columns] = None
+        self._lock = asyncio.Lock()
+        self.loads = 0
+        self.load_errors = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._columns is not None
+
+    @property
+    def version(self) -> Optional[Tuple]:
+        """当前快照的数据版本 (最大交易日, 写入计数)，未加载时为None；策略结果缓存键包含该值"""
+        return self._columns.version if self._columns is not None else None
+
+    @property
+    def trade_date(self) -> Optional[datetime.date]:
+        return self._columns.version[0] if self._columns is not None else None
+
+    def gather(self, codes) -> Dict[str, np.ndarray]:
+        """按代码批量取快照字段，快照中不存在的代码（或快照未加载）取 SNAPSHOT_FIELDS 中的缺失值"""
+        columns = self._columns
+        if columns is None:
+            n = len(codes)
+            return {field: np.full(n, missing, dtype=object if missing is None else float)
+                    for field, missing in SNAPSHOT_FIELDS.items()}
+        pos = columns.positions(codes)
+        return {field: values[pos] for field, values in columns.fields.items()}
+
+    def enrich(self, frame, code_column: str = "code", how: str = "left") -> Dict[str, np.ndarray]:
+        """
+        为策略查询结果补齐快照字段，行顺序不变
+        :param frame: DataFrame 或 列名 -> 数组
+        :param how: left 保留全部行；inner 剔除不在快照中的代码（同原联表口径，快照未加载时保留全部行）
+        :return: 列名 -> 数组，含原有列及 SNAPSHOT_FIELDS
+        """
+        columns = {name: np.asarray(frame[name]) for name in frame}
+        if code_column not in columns:
+            return columns
+        snapshot = self._columns
+        if how == "inner" and snapshot is not None:
+            keep = snapshot.positions(columns[code_column]) >= 0
+            if not keep.all():
+                columns = {name: values[keep] for name, values in columns.items()}
+        return {**columns, **self.gather(columns[code_column])}
+
+    @query_source
+    async def _probe(self) -> Tuple:
+        async with async_engine.connect() as conn:
+            row = (await conn.execute(text(_PROBE_SQL))).one()
+        return row.max_date, row.changes
+
+    @query_source
+    async def _load(self, version: Tuple) -> _Columns:
+        async with async_engine.connect() as conn:
+            rows = (await conn.execute(text(_LOAD_SQL))).all()
+        frame = pd.DataFrame(rows, columns=["code", "trade_date", *SNAPSHOT_FIELDS])
+        # 代码统一为6位并按数组自身的比较规则排序（数据库排序规则可能不同），供二分查找
+        codes = bare_codes(frame["code"])
+        order = np.argsort(codes, kind="stable")
+        frame = frame.iloc[order]
+        fields = {}
+        for field, missing in SNAPSHOT_FIELDS.items():
+            if missing is None:
+                values = frame[field].to_numpy(dtype=object)
+                fields[field] = np.append(values, np.array([None], dtype=object))
+            else:
+                values = pd.to_numeric(frame[field], errors="coerce").to_numpy(dtype=float)
+                fields[field] = np.append(values, missing)
+        return _Columns(version, codes[order], fields)
+
+    async def refresh(self) -> bool:
+        """数据版本变化（或尚未加载）时重新加载，返回是否加载了新快照；失败时保留当前快照"""
+        async with self._lock:
+            try:
+                version = await self._probe()
+                if self._columns is not None and self._columns.version == version:
+                    return False
+                self._columns = await self._load(version)
+            except Exception as e:
+                self.load_errors += 1
+                fallback = f"沿用交易日 {self.trade_date} 的快照" if self.ready else "策略结果暂不含行情指标"
+                logger.warning(f"最新指标快照加载失败，{fallback}：{e}")
+                return False
+            self.loads += 1
+        logger.info(f"最新指标快照已加载：交易日 {version[0]}，{len(self._columns.codes)} 只股票")
+        return True
+
+    async def run_refresh_loop(self, interval: int = REFRESH_INTERVAL):
+        """后台定时探测数据版本（启动时已加载一次）"""
+        while True:
+            await asyncio.sleep(interval)
+            await self.refresh()
+
+    def stats(self) -> Dict[str, object]:
+        """快照状态与加载统计"""
+        return {"ready": self.ready, "tradeDate": str(self.trade_date) if self.ready else None,
+                "rows": len(self._columns.codes) if self.ready else 0, "loads": self.loads,
+                "loadErrors": self.load_errors}
+
+
+latest_snapshot = LatestSnapshot()
@@ -0,0 +1,11 @@
+-- 策略结果缓存版本探测（strategy_management/cache.py）依赖的日期列索引，MAX(date) 走索引而非全表扫描
+CREATE INDEX IF NOT EXISTS idx_strategy_growth_momentum_end_date
+    ON quant_research.strategy_growth_momentum (end_date);
+CREATE INDEX IF NOT EXISTS idx_strategy_divquality_end_date
+    ON quant_research.strategy_divquality (end_date);
+CREATE INDEX IF NOT EXISTS "idx_technicals_strongStocks_watchlist_trade_date"
+    ON quant_research."technicals_strongStocks_watchlist" (trade_date);
+CREATE INDEX IF NOT EXISTS "idx_technicals_strongStocks_signals_trade_date"
+    ON quant_research."technicals_strongStocks_signals" (trade_date);
+CREATE INDEX IF NOT EXISTS idx_platform_stock_daily_trade_date
+    ON quant_research.platform_stock_daily (trade_date);
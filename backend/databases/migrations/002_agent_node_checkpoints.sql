@@ -0,0 +1,11 @@
+-- 智能体节点级检查点（agents/checkpoints.py）：每个节点完成即写入，断线或进程重启后的重复请求只重新生成缺失节点
+CREATE TABLE IF NOT EXISTS ai_agents.fundamental_node_checkpoints (
+    stock_code    VARCHAR     NOT NULL,
+    report_date   DATE        NOT NULL,
+    business_type INTEGER     NOT NULL,
+    node          VARCHAR     NOT NULL,
+    content       TEXT        NOT NULL,
+    thinking      TEXT        NOT NULL DEFAULT '',
+    created_at    TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (stock_code, report_date, business_type, node)
+);
@@ -0,0 +1,5 @@
+-- 智能体研究结果的大文本字段改用 lz4 压缩（PostgreSQL 14+ 且编译启用 lz4 时可选执行）
+-- 只影响之后写入的值；TOAST 对超过约 2KB 的值自动压缩，lz4 比默认 pglz 压缩、解压更快
+ALTER TABLE ai_agents.fundamental_agents_state ALTER COLUMN state SET COMPRESSION lz4;
+ALTER TABLE ai_agents.fundamental_node_checkpoints ALTER COLUMN content SET COMPRESSION lz4;
+ALTER TABLE ai_agents.fundamental_node_checkpoints ALTER COLUMN thinking SET COMPRESSION lz4;
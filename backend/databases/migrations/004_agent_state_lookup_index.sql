@@ -0,0 +1,5 @@
+-- 持久化研究结果查询（agents/history.py）：按 (股票代码, 报告期, 业务类型) 取最新一条记录的id，
+-- INCLUDE id 使存在性探测走仅索引扫描，不读取 state 大字段
+CREATE INDEX IF NOT EXISTS idx_fundamental_agents_state_lookup
+    ON ai_agents.fundamental_agents_state (stock_code, report_date, business_type, created_at DESC)
+    INCLUDE (id);
@@ -0,0 +1,312 @@
+"""
+    本地列式日K行情存储：每个字段一个连续数组文件（按ticker分块、块内按日期升序），启动时内存映射，
+    通过 offsets 定位ticker数据块，查询结果为零拷贝切片；多个uvicorn worker经由操作系统页缓存共享同一份数据。
+    增量刷新重新拉取本地最大日期前 OHLCV_REFRESH_OVERLAP_DAYS 天起的行并整体替换该窗口，
+    以补齐刷新时尚未入库完成的当日数据及对历史K线的修正；合并后写入新版本目录并原子切换 CURRENT 指针。
+
+    目录结构：
+        {root}/CURRENT                 当前版本目录名
+        {root}/{version}/tickers.npy   ticker列表（升序）
+        {root}/{version}/offsets.npy   各ticker数据块起始位置，长度为 len(tickers)+1
+        {root}/{version}/{field}.npy   trade_date, open, high, low, close, vol, amount
+        {root}/{version}/meta.json     最大交易日、行数
+"""
+from __future__ import annotations
+
+import asyncio
+import datetime
+import json
+import logging
+import os
+import shutil
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import text
+
+from databases.databases_connection import engine
+from databases.query_stats import query_source
+from utilities.lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+logger = logging.getLogger(__name__)
+
+PRICE_FIELDS = ("open", "high", "low", "close", "vol", "amount")
+ALL_FIELDS = ("trade_date",) + PRICE_FIELDS
+# 与行情接口口径一致：剔除这些字段存在空值的行
+REQUIRED_FIELDS = ("open", "high", "low", "close", "vol")
+
+DEFAULT_ROOT = os.getenv("OHLCV_STORE_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "ohlcv"))
+REFRESH_INTERVAL = int(os.getenv("OHLCV_REFRESH_INTERVAL", "3600"))  # 秒
+REFRESH_OVERLAP_DAYS = int(os.getenv("OHLCV_REFRESH_OVERLAP_DAYS", "10"))  # 每次刷新重新拉取的尾部窗口（自然日）
+_LOCK_STALE_SECONDS = 2 * 3600
+_RELOAD_CHECK_SECONDS = 1.0
+_FETCH_CHUNKSIZE = 500_000
+
+
+class _Snapshot:
+    """某一版本的内存映射数据"""
+
+    def __init__(self, version: str, tickers: np.ndarray, offsets: np.ndarray, arrays: Dict[str, np.ndarray],
+                 max_trade_date: Optional[datetime.date]):
+        self.version = version
+        self.tickers = tickers
+        self.offsets = offsets
+        self.arrays = arrays
+        self.max_trade_date = max_trade_date
+        self.positions = {str(t): i for i, t in enumerate(tickers)}
+
+
+class OHLCVStore:
+    """内存映射的日K行情存储"""
+
+    def __init__(self, root: str = DEFAULT_ROOT):
+        self.root = root
+        self._snapshot: Optional[_Snapshot] = None
+        self._current_mtime = 0.0
+        self._last_check = 0.0
+
+    # ---------------- 读取 ----------------
+    @property
+    def ready(self) -> bool:
+        return self._current_snapshot() is not None
+
+    @property
+    def max_trade_date(self) -> Optional[datetime.date]:
+        snapshot = self._current_snapshot()
+        return snapshot.max_trade_date if snapshot is not None else None
+
+    def open(self) -> bool:
+        """映射当前版本，存储不存在时返回False"""
+        current = os.path.join(self.root, "CURRENT")
+        try:
+            mtime = os.stat(current).st_mtime
+            with open(current, "r", encoding="utf-8") as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return False
+        if self._snapshot is not None and self._snapshot.version == version:
+            self._current_mtime = mtime
+            return True
+
+        path = os.path.join(self.root, version)
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = {field: np.load(os.path.join(path, f"{field}.npy"), mmap_mode="r") for field in ALL_FIELDS}
+        tickers = np.load(os.path.join(path, "tickers.npy"))
+        offsets = np.load(os.path.join(path, "offsets.npy"))
+        max_trade_date = datetime.date.fromisoformat(meta["max_trade_date"]) if meta.get("max_trade_date") else None
+        self._snapshot = _Snapshot(version, tickers, offsets, arrays, max_trade_date)
+        self._current_mtime = mtime
+        logger.info(f"OHLCV存储已加载：版本 {version}，{len(tickers)} 只股票，{meta.get('rows', 0)} 行")
+        return True
+
+    def _current_snapshot(self) -> Optional[_Snapshot]:
+        """按间隔检查CURRENT指针，其他worker完成刷新后自动重新映射"""
+        now = time.monotonic()
+        if now - self._last_check >= _RELOAD_CHECK_SECONDS:
+            self._last_check = now
+            try:
+                mtime = os.stat(os.path.join(self.root, "CURRENT")).st_mtime
+                if mtime != self._current_mtime:
+                    self.open()
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.error(f"OHLCV存储重新加载失败：{e}")
+        return self._snapshot
+
+    def get(self, ticker: str) -> Optional[Dict[str, np.ndarray]]:
+        """获取单只股票全部日K（零拷贝切片），无数据返回None"""
+        snapshot = self._current_snapshot()
+        if snapshot is None:
+            return None
+        pos = snapshot.positions.get(ticker)
+        if pos is None:
+            return None
+        start, end = snapshot.offsets[pos], snapshot.offsets[pos + 1]
+        return {field: arr[start:end] for field, arr in snapshot.arrays.items()}
+
+    def window(self, ticker: str, start_date: Optional[str] = None,
+               end_date: Optional[str] = None) -> Optional[Dict[str, np.ndarray]]:
+        """按日期区间（含两端）获取日K切片"""
+        bars = self.get(ticker)
+        if bars is None:
+            return None
+        dates = bars["trade_date"]
+        lo = 0 if start_date is None else int(np.searchsorted(dates, np.datetime64(start_date, "D"), side="left"))
+        hi = len(dates) if end_date is None else int(np.searchsorted(dates, np.datetime64(end_date, "D"), side="right"))
+        return {field: arr[lo:hi] for field, arr in bars.items()}
+
+    def tail(self, ticker: str, n: int) -> Optional[Dict[str, np.ndarray]]:
+        """获取最近 n 个交易日的日K切片"""
+        bars = self.get(ticker)
+        if bars is None:
+            return None
+        return {field: arr[-n:] for field, arr in bars.items()}
+
+    # ---------------- 刷新 ----------------
+    def _acquire_lock(self) -> Optional[int]:
+        """跨进程写锁，多个worker同时刷新时只有一个执行"""
+        lock = os.path.join(self.root, ".refresh.lock")
+        try:
+            if time.time() - os.stat(lock).st_mtime > _LOCK_STALE_SECONDS:
+                os.remove(lock)
+        except FileNotFoundError:
+            pass
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return None
+        os.write(fd, str(os.getpid()).encode())
+        return fd
+
+    def _release_lock(self, fd: int):
+        os.close(fd)
+        try:
+            os.remove(os.path.join(self.root, ".refresh.lock"))
+        except FileNotFoundError:
+            pass
+
+    @query_source
+    def _fetch_rows(self, since: Optional[datetime.date]):
+        """拉取 since 及之后的日K行（since为空时全量），返回 (tickers, tids, 字段数组)"""
+        sql = """
+            SELECT ticker, trade_date, open, high, low, close, vol, amount
+            FROM quant_research.market_daily_ts
+            {where}
+            ORDER BY ticker, trade_date, id
+        """.format(where="WHERE trade_date >= :since" if since is not None else "")
+        params = {"since": since} if since is not None else None
+
+        ticker_ids: Dict[str, int] = {}
+        tid_parts, field_parts = [], {field: [] for field in ALL_FIELDS}
+        with engine.connect() as conn:
+            for chunk in pd.read_sql(text(sql), conn, params=params, chunksize=_FETCH_CHUNKSIZE):
+                # ticker字符串只在块内去重后映射为整数，避免全量持有字符串对象
+                codes, uniques = pd.factorize(chunk["ticker"])
+                mapping = np.array([ticker_ids.setdefault(u, len(ticker_ids)) for u in uniques], dtype=np.int32)
+                tid_parts.append(mapping[codes])
+                field_parts["trade_date"].append(pd.to_datetime(chunk["trade_date"]).to_numpy().astype("datetime64[D]"))
+                for field in PRICE_FIELDS:
+                    field_parts[field].append(pd.to_numeric(chunk[field], errors="coerce").to_numpy(dtype=np.float64))
+        if not tid_parts:
+            return np.array([], dtype=str), np.array([], dtype=np.int32), None
+
+        tickers = np.array(sorted(ticker_ids, key=ticker_ids.get), dtype=str)
+        tids = np.concatenate(tid_parts)
+        fields = {field: np.concatenate(parts) for field, parts in field_parts.items()}
+
+        # 同一(ticker, trade_date)保留最后一条，剔除必填字段为空的行
+        keep = np.ones(len(tids), dtype=bool)
+        keep[:-1] = ~((tids[:-1] == tids[1:]) & (fields["trade_date"][:-1] == fields["trade_date"][1:]))
+        for field in REQUIRED_FIELDS:
+            keep &= ~np.isnan(fields[field])
+        if not keep.any():
+            return tickers, tids[keep], None
+        return tickers, tids[keep], {field: arr[keep] for field, arr in fields.items()}
+
+    @staticmethod
+    def _same_rows(old_keys: np.ndarray, old_fields: Dict[str, np.ndarray],
+                   new_keys: np.ndarray, new_fields: Dict[str, np.ndarray]) -> bool:
+        """比较重新拉取窗口内的新旧数据是否完全一致"""
+        if len(old_keys) != len(new_keys):
+            return False
+        old_order = np.lexsort((old_fields["trade_date"], old_keys))
+        new_order = np.lexsort((new_fields["trade_date"], new_keys))
+        if not np.array_equal(old_keys[old_order], new_keys[new_order]):
+            return False
+        if not np.array_equal(old_fields["trade_date"][old_order], new_fields["trade_date"][new_order]):
+            return False
+        return all(np.array_equal(old_fields[field][old_order], new_fields[field][new_order], equal_nan=True)
+                   for field in PRICE_FIELDS)
+
+    def refresh(self) -> bool:
+        """增量刷新：替换尾部窗口内的数据，写入新版本并切换CURRENT，返回是否产生了新版本"""
+        os.makedirs(self.root, exist_ok=True)
+        fd = self._acquire_lock()
+        if fd is None:
+            logger.info("OHLCV存储正在由其他进程刷新，跳过")
+            return False
+        try:
+            self.open()
+            old = self._snapshot
+            since = old.max_trade_date if old is not None else None
+            cutoff = since - datetime.timedelta(days=REFRESH_OVERLAP_DAYS) if since is not None else None
+            new_tickers, new_tids, new_fields = self._fetch_rows(cutoff)
+            if new_fields is None:
+                logger.info(f"OHLCV存储无新增数据，最新交易日 {since}")
+                return False
+
+            # 合并ticker列表；旧数据中窗口内的行整体由重新拉取的行替换
+            old_tickers = old.tickers if old is not None else np.array([], dtype=str)
+            tickers = np.union1d(old_tickers, new_tickers)
+            new_keys = np.searchsorted(tickers, new_tickers)[new_tids]
+            if old is not None:
+                old_keys = np.repeat(np.searchsorted(tickers, old_tickers), np.diff(old.offsets))
+                old_keep = old.arrays["trade_date"] < np.datetime64(cutoff, "D")
+                old_window = {field: arr[~old_keep] for field, arr in old.arrays.items()}
+                if self._same_rows(old_keys[~old_keep], old_window, new_keys, new_fields):
+                    logger.info(f"OHLCV存储无新增或修正数据，最新交易日 {since}")
+                    return False
+                old_keys = old_keys[old_keep]
+            else:
+                old_keep = None
+                old_keys = np.array([], dtype=np.int64)
+
+            # 旧数据块在前、窗口内新数据在后，稳定排序后块内仍按日期升序
+            keys = np.concatenate([old_keys, new_keys])
+            order = np.argsort(keys, kind="stable")
+            offsets = np.zeros(len(tickers) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum(np.bincount(keys, minlength=len(tickers)))
+
+            version = datetime.datetime.now().strftime("v%Y%m%d%H%M%S%f")
+            path = os.path.join(self.root, version)
+            os.makedirs(path)
+            np.save(os.path.join(path, "tickers.npy"), tickers)
+            np.save(os.path.join(path, "offsets.npy"), offsets)
+            max_trade_date = None
+            for field in ALL_FIELDS:
+                parts = [old.arrays[field][old_keep], new_fields[field]] if old is not None else [new_fields[field]]
+                out = np.lib.format.open_memmap(os.path.join(path, f"{field}.npy"), mode="w+",
+                                                dtype=new_fields[field].dtype, shape=(len(keys),))
+                out[:] = np.concatenate(parts)[order]
+                if field == "trade_date":
+                    max_trade_date = str(np.max(out))
+                out.flush()
+                del out
+            with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump({"max_trade_date": max_trade_date, "rows": int(len(keys))}, f)
+
+            # 原子切换版本指针
+            tmp = os.path.join(self.root, "CURRENT.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(version)
+            os.replace(tmp, os.path.join(self.root, "CURRENT"))
+            self.open()
+            self._cleanup(keep={version, old.version if old is not None else version})
+            logger.info(f"OHLCV存储刷新完成：重新拉取 {cutoff} 起 {len(new_tids)} 行，最新交易日 {max_trade_date}")
+            return True
+        finally:
+            self._release_lock(fd)
+
+    def _cleanup(self, keep: set):
+        """删除旧版本目录（保留当前及上一版本，供尚未切换的worker继续读取）"""
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.startswith("v") and name not in keep and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    async def run_refresh_loop(self, interval: int = REFRESH_INTERVAL):
+        """后台定时增量刷新"""
+        while True:
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                logger.exception(f"OHLCV存储刷新失败：{e}")
+            await asyncio.sleep(interval)
+
+
+ohlcv_store = OHLCVStore()
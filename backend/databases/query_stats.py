@@ -0,0 +1,245 @@
+"""
+    SQL语句计时：同步引擎与异步引擎（sync_engine）的游标执行事件中计时，按调用路由、服务方法归属，
+    按归一化SQL汇总耗时与行数，保留最慢的 N 条执行记录；超过阈值的查询可在后台线程采集 EXPLAIN (ANALYZE, BUFFERS)
+    路由由 QueryRouteMiddleware 写入上下文变量，服务方法由 @query_source 标注
+"""
+import contextvars
+import functools
+import heapq
+import inspect
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from utilities.metrics import metrics
+
+# 慢查询阈值（毫秒）
+SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_MS", "200"))
+# 保留的最慢执行条数
+SLOW_QUERY_TOP_N = int(os.getenv("SQL_TOP_N", "20"))
+# 超过该耗时（毫秒）的查询采集执行计划，0 表示关闭；EXPLAIN ANALYZE 会再次执行查询，只用于只读语句
+EXPLAIN_THRESHOLD_MS = float(os.getenv("SQL_EXPLAIN_MS", "0"))
+# 同一归一化语句两次采集执行计划的最小间隔（秒）
+EXPLAIN_INTERVAL_SECONDS = 300
+# 最多汇总的归一化语句数，超出后新语句计入 "<other>"
+MAX_STATEMENTS = int(os.getenv("SQL_STATS_MAX_STATEMENTS", "500"))
+
+current_route: contextvars.ContextVar[str] = contextvars.ContextVar("sql_route", default="")
+current_source: contextvars.ContextVar[str] = contextvars.ContextVar("sql_source", default="")
+
+QUERY_SECONDS = metrics.histogram("sql_query_duration_seconds", "SQL语句执行耗时", ("source",),
+                                  buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+SLOW_QUERIES_TOTAL = metrics.counter("sql_slow_queries_total", "超过慢查询阈值的SQL执行次数", ("source",))
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w$.])-?\d+(?:\.\d+)?\b")
+_PARAM = re.compile(r"%\(\w+\)s|\$\d+|%s|:\w+")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+@functools.lru_cache(maxsize=2048)
+def normalize_sql(statement: str) -> str:
+    """归一化SQL：字面量、绑定参数替换为 ?，IN 列表合并，空白压缩"""
+    sql = _STRING.sub("?", statement)
+    sql = _PARAM.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _IN_LIST.sub("(...)", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+def query_source(func):
+    """标注服务方法，方法内执行的SQL归属到该方法"""
+    name = func.__qualname__
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            token = current_source.set(name)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                current_source.reset(token)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = current_source.set(name)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            current_source.reset(token)
+    return wrapper
+
+
+class QueryRouteMiddleware:
+    """ASGI中间件：把请求方法与路径写入上下文变量，供SQL计时归属路由（后台任务继承创建时的上下文）"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = current_route.set(f"{scope['method']} {scope['path']}")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_route.reset(token)
+
+
+class QueryStats:
+    """SQL执行统计：归一化语句汇总 + 最慢执行 top-N"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._statements: Dict[str, Dict[str, Any]] = {}
+        self._slowest: List[Tuple[float, int, Dict[str, Any]]] = []  # 小顶堆
+        self._seq = 0
+        self._explained: Dict[str, float] = {}
+        self._explain_engine: Optional[Engine] = None
+        self._explain_pool: Optional[ThreadPoolExecutor] = None
+        self.started_at = time.time()
+
+    def record(self, statement: str, parameters: Any, elapsed: float, rows: int, dialect: str):
+        elapsed_ms = elapsed * 1000
+        sql = normalize_sql(statement)
+        route, source = current_route.get(), current_source.get()
+        QUERY_SECONDS.observe(source or "<none>", value=elapsed)
+        with self._lock:
+            item = self._statements.get(sql)
+            if item is None:
+                if len(self._statements) >= MAX_STATEMENTS:
+                    sql = "<other>"
+                    item = self._statements.get(sql)
+                if item is None:
+                    item = self._statements[sql] = {"sql": sql, "calls": 0, "totalMs": 0.0, "maxMs": 0.0,
+                                                    "rows": 0, "sources": {}}
+            item["calls"] += 1
+            item["totalMs"] += elapsed_ms
+            item["maxMs"] = max(item["maxMs"], elapsed_ms)
+            item["rows"] += max(rows, 0)
+            caller = f"{route} | {source}" if route or source else "<none>"
+            item["sources"][caller] = item["sources"].get(caller, 0) + 1
+
+            if elapsed_ms < SLOW_QUERY_MS:
+                return
+            self._seq += 1
+            entry = {"sql": sql, "ms": round(elapsed_ms, 2), "rows": rows, "route": route, "source": source,
+                     "at": time.time(), "plan": None}
+            if len(self._slowest) < SLOW_QUERY_TOP_N:
+                heapq.heappush(self._slowest, (elapsed_ms, self._seq, entry))
+            elif elapsed_ms > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, (elapsed_ms, self._seq, entry))
+            else:
+                entry = None
+        SLOW_QUERIES_TOTAL.inc(source or "<none>")
+        if entry is not None and self._should_explain(sql, statement, elapsed_ms):
+            self._explain_pool.submit(self._explain, entry, statement, parameters, dialect)  # type: ignore
+
+    # ---------------- 执行计划 ----------------
+    def enable_explain(self, engine: Engine):
+        """设置采集执行计划所用的同步引擎（独立连接，在后台线程执行）"""
+        self._explain_engine = engine
+        self._explain_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sql-explain")
+
+    def _should_explain(self, sql: str, statement: str, elapsed_ms: float) -> bool:
+        if not EXPLAIN_THRESHOLD_MS or elapsed_ms < EXPLAIN_THRESHOLD_MS or self._explain_pool is None:
+            return False
+        if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            return False
+        now = time.monotonic()
+        with self._lock:
+            if now - self._explained.get(sql, -EXPLAIN_INTERVAL_SECONDS) < EXPLAIN_INTERVAL_SECONDS:
+                return False
+            self._explained[sql] = now
+        return True
+
+    @staticmethod
+    def _to_pyformat(statement: str, parameters: Any) -> Tuple[str, Any]:
+        """asyncpg 的 $n 参数转换为 psycopg2 的 %s 参数"""
+        if not re.search(r"\$\d+", statement):
+            return statement, parameters
+        values: List[Any] = []
+
+        def repl(match):
+            values.append(parameters[int(match.group(1)) - 1])
+            return "%s"
+
+        return re.sub(r"\$(\d+)", repl, statement.replace("%", "%%")), tuple(values)
+
+    def _explain(self, entry: Dict[str, Any], statement: str, parameters: Any, dialect: str):
+        try:
+            if dialect != "psycopg2":
+                statement, parameters = self._to_pyformat(statement, parameters)
+            connection = self._explain_engine.raw_connection()  # type: ignore
+            try:
+                cursor = connection.cursor()
+                cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT TEXT) " + statement, parameters or None)
+                plan = "\n".join(row[0] for row in cursor.fetchall())
+                cursor.close()
+            finally:
+                connection.close()
+        except Exception as e:
+            plan = f"EXPLAIN 失败：{e}"
+        with self._lock:
+            entry["plan"] = plan
+
+    # ---------------- 输出 ----------------
+    def snapshot(self, top: int = SLOW_QUERY_TOP_N) -> Dict[str, Any]:
+        with self._lock:
+            statements = sorted(self._statements.values(), key=lambda s: s["totalMs"], reverse=True)[:top]
+            slowest = [dict(entry) for _, _, entry in sorted(self._slowest, reverse=True)]
+            statements = [{**s, "totalMs": round(s["totalMs"], 2), "maxMs": round(s["maxMs"], 2),
+                           "avgMs": round(s["totalMs"] / s["calls"], 2), "sources": dict(s["sources"])}
+                          for s in statements]
+        return {
+            "since": self.started_at,
+            "slowThresholdMs": SLOW_QUERY_MS,
+            "explainThresholdMs": EXPLAIN_THRESHOLD_MS,
+            "statements": statements,
+            "slowest": slowest,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
+            self._slowest.clear()
+            self._explained.clear()
+            self.started_at = time.time()
+
+
+query_stats = QueryStats()
+
+
+def install_query_hooks(*engines: Engine, explain_engine: Optional[Engine] = None):
+    """在同步引擎（异步引擎传入其 sync_engine）上注册计时钩子"""
+    for engine in engines:
+        dialect = engine.dialect.driver
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def _before(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def _after(conn, cursor, statement, parameters, context, executemany, _dialect=dialect):
+            started = conn.info["query_started"].pop()
+            rows = getattr(cursor, "rowcount", -1)
+            query_stats.record(statement, parameters, time.perf_counter() - started,
+                               rows if isinstance(rows, int) else -1, _dialect)
+
+        @event.listens_for(engine, "handle_error")
+        def _error(exception_context):
+            conn = exception_context.connection
+            if conn is not None and conn.info.get("query_started"):
+                conn.info["query_started"].pop()
+
+    if explain_engine is not None:
+        query_stats.enable_explain(explain_engine)
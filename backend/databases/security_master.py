@@ -0,0 +1,159 @@
+"""
+    证券主数据：basic_info_stock 常驻进程内存，代码统一为6位，提供简称、行业、板块、上市状态的常数时间查询
+    及按代码数组的批量查询；服务层、智能体路由与持久化统一经此解析代码，不再各自截取或临时联表
+    启动时加载；后台按间隔探测数据版本（行数 + 写入计数），变化时整体重新加载，加载失败时保留当前数据
+"""
+from __future__ import annotations
+
+import asyncio
+import datetime
+import logging
+import os
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from sqlalchemy import text
+
+from databases.databases_connection import async_engine
+from databases.query_stats import query_source
+from utilities.basic_funcs import bare_code, bare_codes, code_positions, suffix_codes
+from utilities.lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+logger = logging.getLogger(__name__)
+
+# 上市状态：L 上市，D 退市，P 暂停上市
+LISTED = "L"
+REFRESH_INTERVAL = int(os.getenv("SECURITY_MASTER_REFRESH_INTERVAL", "3600"))  # 秒
+
+_LOAD_SQL = """
+    SELECT ticker, short_name, industry, market, list_date, status
+    FROM quant_research.basic_info_stock
+"""
+_PROBE_SQL = """
+    SELECT (SELECT COUNT(*) FROM quant_research.basic_info_stock) AS row_count,
+           (SELECT n_tup_ins + n_tup_upd + n_tup_del FROM pg_stat_user_tables
+            WHERE schemaname = 'quant_research' AND relname = 'basic_info_stock') AS changes
+"""
+
+
+class Security(NamedTuple):
+    code: str  # 6位代码
+    symbol: str  # 带交易所后缀代码
+    short_name: Optional[str]
+    industry: Optional[str]
+    market: Optional[str]
+    list_date: Optional[datetime.date]
+    status: Optional[str]
+
+    @property
+    def listed(self) -> bool:
+        return self.status == LISTED
+
+
+class _Table:
+    """某一版本的主数据：codes 升序（6位），positions 供单个代码常数时间查询"""
+
+    def __init__(self, version: Tuple, frame: pd.DataFrame):
+        self.version = version
+        self.codes = frame["code"].to_numpy(dtype=str)
+        self.symbols = suffix_codes(self.codes)
+        self.columns = {field: frame[field].to_numpy(dtype=object) for field in Security._fields[2:]}
+        self.positions = {code: i for i, code in enumerate(self.codes.tolist())}
+
+
+class SecurityMaster:
+    """basic_info_stock 的进程内主数据"""
+
+    def __init__(self):
+        self._table: Optional[_Table] = None
+        self._lock = asyncio.Lock()
+        self.loads = 0
+        self.load_errors = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._table is not None
+
+    # ---------------- 单个代码 ----------------
+    def get(self, code: str) -> Optional[Security]:
+        """按6位或带后缀代码查询，不存在（或主数据未加载）时返回None"""
+        table = self._table
+        if table is None:
+            return None
+        pos = table.positions.get(bare_code(code))
+        if pos is None:
+            return None
+        return Security(str(table.codes[pos]), str(table.symbols[pos]),
+                        *(values[pos] for values in table.columns.values()))
+
+    def short_name(self, code: str) -> Optional[str]:
+        security = self.get(code)
+        return security.short_name if security is not None else None
+
+    def is_listed(self, code: str) -> bool:
+        security = self.get(code)
+        return security is not None and security.listed
+
+    # ---------------- 代码数组 ----------------
+    def gather(self, codes, fields=("short_name", "industry")) -> Dict[str, np.ndarray]:
+        """按代码数组批量取字段，不存在的代码为None"""
+        table = self._table
+        if table is None:
+            return {field: np.full(len(codes), None, dtype=object) for field in fields}
+        pos = code_positions(table.codes, bare_codes(codes))
+        found = pos >= 0
+        out = {}
+        for field in fields:
+            values = np.full(len(pos), None, dtype=object)
+            values[found] = table.columns[field][pos[found]]
+            out[field] = values
+        return out
+
+    # ---------------- 加载 ----------------
+    @query_source
+    async def _probe(self) -> Tuple:
+        async with async_engine.connect() as conn:
+            row = (await conn.execute(text(_PROBE_SQL))).one()
+        return row.row_count, row.changes
+
+    @query_source
+    async def _load(self, version: Tuple) -> _Table:
+        async with async_engine.connect() as conn:
+            rows = (await conn.execute(text(_LOAD_SQL))).all()
+        frame = pd.DataFrame(rows, columns=["code", *Security._fields[2:]])
+        # 代码统一为6位并按数组自身的比较规则排序（数据库排序规则可能不同），供二分查找
+        codes, first = np.unique(bare_codes(frame["code"]), return_index=True)
+        frame = frame.iloc[first].assign(code=codes)
+        return _Table(version, frame)
+
+    async def refresh(self) -> bool:
+        """数据版本变化（或尚未加载）时重新加载，返回是否加载了新数据；失败时保留当前数据"""
+        async with self._lock:
+            try:
+                version = await self._probe()
+                if self._table is not None and self._table.version == version:
+                    return False
+                self._table = await self._load(version)
+            except Exception as e:
+                self.load_errors += 1
+                logger.warning(f"证券主数据加载失败{'，沿用当前数据' if self.ready else ''}：{e}")
+                return False
+            self.loads += 1
+        logger.info(f"证券主数据已加载：{len(self._table.codes)} 只股票")
+        return True
+
+    async def run_refresh_loop(self, interval: int = REFRESH_INTERVAL):
+        """后台定时探测数据版本（启动时已加载一次）"""
+        while True:
+            await asyncio.sleep(interval)
+            await self.refresh()
+
+    def stats(self) -> Dict[str, object]:
+        """主数据状态与加载统计"""
+        return {"ready": self.ready, "rows": len(self._table.codes) if self.ready else 0, "loads": self.loads,
+                "loadErrors": self.load_errors}
+
+
+security_master = SecurityMaster()
@@ -1,21 +1,45 @@
-import pandas as pd
+import asyncio
 import uvicorn
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from typing import List
 from strategy_management.routes import strategy_router
 from agents.multiagents import agents_router
 from fastapi.middleware.cors import CORSMiddleware
 from agents.multiagents import init_agent_db_pool
+from agents.providers import init_provider_clients, close_provider_clients
+from agents.prompt_registry import prompt_registry
+from databases.ohlcv_store import ohlcv_store
+from databases.latest_snapshot import latest_snapshot
+from databases.security_master import security_master
+from databases.databases_connection import async_engine
+from utilities.metrics import metrics
+from databases.query_stats import QueryRouteMiddleware, query_stats
 from contextlib import asynccontextmanager
 import os
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup only
     await init_agent_db_pool()
+    # 大模型客户端及连接池全局共享；SDK导入较慢，在后台线程预热，worker 启动后即可接收请求
+    provider_warmup = asyncio.create_task(asyncio.to_thread(init_provider_clients))
+    prompt_registry.load()  # 提示词模板一次性加载并预编译
+    # 映射本地行情存储，并在后台增量刷新
+    ohlcv_store.open()
+    refresh_task = asyncio.create_task(ohlcv_store.run_refresh_loop())
+    # 证券主数据、最新指标快照常驻内存，数据版本变化时重新加载；加载失败不阻止启动
+    await asyncio.gather(security_master.refresh(), latest_snapshot.refresh())
+    master_task = asyncio.create_task(security_master.run_refresh_loop())
+    snapshot_task = asyncio.create_task(latest_snapshot.run_refresh_loop())
     yield
+    refresh_task.cancel()
+    snapshot_task.cancel()
+    master_task.cancel()
+    await asyncio.gather(provider_warmup, return_exceptions=True)
+    await close_provider_clients()
+    await async_engine.dispose()
 
 # 创建FastAPI应用
 app = FastAPI(title="每日选股复盘系统", description="提供策略和个股研究的管理功能", lifespan=lifespan)
@@ -28,6 +52,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# SQL计时按请求路由归属
+app.add_middleware(QueryRouteMiddleware)
+
 # 注册路由
 app.include_router(strategy_router)
 app.include_router(agents_router)
@@ -44,6 +71,25 @@ async def root():
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus 抓取接口：大模型节点耗时、供应商治理等指标"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/debug/sql")
+async def debug_sql(top: int = 20):
+    """SQL耗时统计：按总耗时排序的归一化语句及最慢执行记录（含执行计划）"""
+    return query_stats.snapshot(top)
+
+
+@app.delete("/debug/sql")
+async def reset_debug_sql():
+    """清空SQL耗时统计"""
+    query_stats.reset()
+    return {"reset": True}
+
+
 if __name__ == '__main__':
     print(os.getcwd())
     uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True, log_level='debug')
\ No newline at end of file
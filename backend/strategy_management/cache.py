@@ -0,0 +1,171 @@
+"""
+    策略结果缓存：按数据版本失效的LRU缓存
+    各缓存条目记录其来源表的数据版本（最大日期 + 写入计数），每日数据入库后版本变化，旧条目在下次访问时自动丢弃
+    最大日期走日期列索引（见 databases/migrations/001_strategy_date_indexes.sql），写入计数取自 pg_stat_user_tables，
+    探测不扫描数据表
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+
+from databases.databases_connection import async_engine
+from databases.query_stats import query_source
+
+logger = logging.getLogger(__name__)
+
+# 来源表 -> 版本日期列
+SOURCE_TABLES = {
+    "strategy_growth_momentum": "end_date",
+    "strategy_divquality": "end_date",
+    "technicals_strongStocks_watchlist": "trade_date",
+    "technicals_strongStocks_signals": "trade_date",
+}
+
+_PROBE_SQL = " UNION ALL ".join(
+    f"SELECT '{table}' AS source, "
+    f"(SELECT MAX({column}) FROM quant_research.\"{table}\") AS max_date, "
+    f"(SELECT n_tup_ins + n_tup_upd + n_tup_del FROM pg_stat_user_tables "
+    f"WHERE schemaname = 'quant_research' AND relname = '{table}') AS changes"
+    for table, column in SOURCE_TABLES.items()
+)
+
+
+class VersionedLRUCache:
+    """带数据版本校验的LRU缓存"""
+
+    def __init__(self, max_size: int = 256, probe_interval: float = 30.0):
+        """
+        :param max_size: 最大条目数，超出时淘汰最久未使用的条目
+        :param probe_interval: 数据版本探测间隔（秒），间隔内复用上次探测结果
+        """
+        self.max_size = max_size
+        self.probe_interval = probe_interval
+        self._entries: "OrderedDict[Hashable, Tuple[Tuple, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, Tuple[Tuple, asyncio.Task]] = {}
+        self._probe_lock = asyncio.Lock()
+        self._versions: Dict[str, Tuple] = {}
+        self._probed_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale = 0
+        self.probes = 0
+        self.probe_errors = 0
+        self.coalesced = 0
+
+    @query_source
+    async def probe_versions(self) -> Dict[str, Tuple]:
+        """
+        单次查询获取全部来源表的 (最大日期, 写入计数)，在探测间隔内直接返回缓存结果
+        探测失败时沿用上次结果（并在一个探测间隔后重试），从未成功探测过则抛出异常
+        """
+        if self._versions and time.monotonic() - self._probed_at < self.probe_interval:
+            return self._versions
+        async with self._probe_lock:
+            # 并发请求只发起一次探测
+            if self._versions and time.monotonic() - self._probed_at < self.probe_interval:
+                return self._versions
+            try:
+                async with async_engine.connect() as conn:
+                    rows = (await conn.execute(text(_PROBE_SQL))).all()
+            except Exception as e:
+                self.probe_errors += 1
+                if not self._versions:
+                    raise
+                logger.warning(f"数据版本探测失败，沿用上次版本：{e}")
+                self._probed_at = time.monotonic()
+                return self._versions
+            self._versions = {row.source: (row.max_date, row.changes) for row in rows}
+            self._probed_at = time.monotonic()
+            self.probes += 1
+        return self._versions
+
+    async def _version_of(self, tables: Sequence[str]) -> Tuple:
+        versions = await self.probe_versions()
+        return tuple(versions.get(table) for table in tables)
+
+    async def get_or_compute(self, key: Hashable, tables: Sequence[str],
+                             compute: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        读取缓存，未命中或数据版本变化时调用 compute 重新计算
+        同一键、同一版本的并发未命中只计算一次，其余请求等待同一结果
+        :param key: 缓存键
+        :param tables: 结果依赖的来源表
+        :param compute: 异步计算函数
+        """
+        # 探测期间其他请求可能已替换、删除或淘汰该条目，条目在 await 之后读取
+        try:
+            version = await self._version_of(tables)
+        except Exception as e:
+            # 数据库暂不可用：有缓存时直接返回缓存结果
+            entry = self._entries.get(key)
+            if entry is not None:
+                logger.warning(f"数据版本探测失败，返回缓存结果：{e}")
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            raise
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self._entries.pop(key, None)
+            self.stale += 1
+
+        inflight = self._inflight.get(key)
+        if inflight is not None and inflight[0] == version:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            inflight = (version, asyncio.ensure_future(self._compute(key, version, compute)))
+            self._inflight[key] = inflight
+        # shield：发起请求被取消时不影响其他等待者
+        return await asyncio.shield(inflight[1])
+
+    async def _compute(self, key: Hashable, version: Tuple, compute: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await compute()
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return value
+        finally:
+            if key in self._inflight and self._inflight[key][0] == version:
+                del self._inflight[key]
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """手动失效，key为空时清空全部条目"""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+        self._probed_at = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存命中与淘汰统计"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxSize": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "stale": self.stale,
+            "coalesced": self.coalesced,
+            "probes": self.probes,
+            "probeErrors": self.probe_errors,
+            "versions": {table: {"maxDate": str(v[0]) if v[0] is not None else None, "changes": v[1]}
+                         for table, v in self._versions.items()},
+        }
+
+
+strategy_cache = VersionedLRUCache()
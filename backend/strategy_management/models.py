@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field, field_validator, ConfigDict
-from typing import Optional, Dict, Annotated, List
+from pydantic import BaseModel, Field, field_validator, model_validator, ConfigDict
+from typing import Optional, Dict, Annotated, List, Literal
 from datetime import datetime
 
 class Strategy(BaseModel):
@@ -72,4 +72,67 @@ class StrategyFilter(BaseModel):
 
 class StockPrice(BaseModel):
     """股票价格模型"""
-    stock_code: str = Field(alias='stockCode', description="股票代码")
\ No newline at end of file
+    model_config = ConfigDict(populate_by_name=True, str_strip_whitespace=True)
+
+    stock_code: str = Field(alias='stockCode', description="股票代码")
+    start_date: Optional[str] = Field(None, alias='startDate', description="开始日期（含），为空时不限制")
+    end_date: Optional[str] = Field(None, alias='endDate', description="结束日期（含），为空时不限制")
+    max_points: Optional[int] = Field(None, alias='maxPoints', ge=3, description="最大返回K线数量，超出时按LTTB降采样")
+    level: Literal['daily', 'weekly', 'monthly'] = Field('daily', description="K线聚合级别：日/周/月")
+
+    @field_validator('start_date', 'end_date', mode='before')
+    @classmethod
+    def parse_and_validate_date(cls, v) -> Optional[str]:
+        """解析并验证日期格式，空值表示不限制"""
+        if v is None or v == "":
+            return None
+        if isinstance(v, str):
+            for fmt in ['%Y-%m-%d', '%Y/%m/%d', '%Y%m%d']:
+                try:
+                    dt = datetime.strptime(v, fmt)
+                    return dt.strftime('%Y-%m-%d')
+                except ValueError:
+                    continue
+            raise ValueError('日期格式错误，支持格式：YYYY-MM-DD, YYYY/MM/DD, YYYYMMDD')
+        raise ValueError('日期必须是字符串')
+
+    @model_validator(mode='after')
+    def validate_date_range(self) -> 'StockPrice':
+        """开始日期不能晚于结束日期"""
+        if self.start_date and self.end_date and self.start_date > self.end_date:
+            raise ValueError('开始日期不能晚于结束日期')
+        return self
+
+class StockResultItem(BaseModel):
+    """策略选股结果条目（接口输出）"""
+    model_config = ConfigDict(populate_by_name=True)
+
+    code: str = Field(description="股票代码（含交易所后缀）")
+    trade_date: int = Field(alias='tradeDate', description="信号日期，毫秒时间戳")
+    short_name: Optional[str] = Field(None, alias='shortName', description="股票简称")
+    industry_name: Optional[str] = Field(None, alias='industryName', description="行业名称")
+    total_mv: Optional[float] = Field(None, alias='totalMv', description="总市值")
+    score: Optional[float] = Field(None, description="信号值")
+    themes: List[str] = Field(default_factory=list, description="主题标签")
+    change_20d: Optional[float] = Field(None, alias='change20d', description="20日涨跌幅")
+
+class PriceBarItem(BaseModel):
+    """K线数据条目（接口输出）"""
+    model_config = ConfigDict(populate_by_name=True)
+
+    trade_date: int = Field(alias='tradeDate', description="交易日期，毫秒时间戳")
+    open: Optional[float] = Field(None, description="开盘价")
+    close: Optional[float] = Field(None, description="收盘价")
+    high: Optional[float] = Field(None, description="最高价")
+    low: Optional[float] = Field(None, description="最低价")
+    volume: Optional[float] = Field(None, description="成交量")
+
+class StrategyAggregationItem(BaseModel):
+    """策略聚合结果（接口输出）"""
+    model_config = ConfigDict(populate_by_name=True)
+
+    strategy_id: int = Field(alias='strategyId', description="策略ID")
+    name: str = Field(description="策略名称")
+    filter_options: List[dict] = Field(default_factory=list, alias='filterOptions', description="筛选项")
+    stock_groups: List[StockResultItem] = Field(default_factory=list, alias='stockGroups', description="选股结果")
+    stage: str = Field(default="", description="阶段")
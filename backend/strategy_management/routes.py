@@ -2,9 +2,13 @@ from fastapi import APIRouter, HTTPException
 from typing import List
 
 from .models import (
-    Strategy, StrategyStockItem, StrategyResultRequest, StrategyFilter, StockPrice
+    Strategy, StrategyStockItem, StrategyResultRequest, StrategyFilter, StockPrice,
+    StockResultItem, PriceBarItem, StrategyAggregationItem
 )
 from .services import StrategyService, StockPriceService
+from .cache import strategy_cache
+from databases.latest_snapshot import latest_snapshot
+from utilities.result_builder import FastJSONResponse
 
 # 创建路由器
 strategy_router = APIRouter(prefix="/strategies", tags=["strategies"])
@@ -15,7 +19,7 @@ async def list_strategies():
     """获取所有策略列表"""
     return StrategyService.get_all_strategies()
 
-@strategy_router.post("/getStrategyResults", response_model=List[dict], 
+@strategy_router.post("/getStrategyResults", response_model=List[StockResultItem], response_class=FastJSONResponse,
                       summary="获取策略选股结果", description="根据策略ID、报告日期、日期周期和强势股阶段获取对应的选股结果")
 async def get_strategy_results(request: StrategyResultRequest):
     """获取特定策略详情"""
@@ -27,31 +31,42 @@ async def get_strategy_results(request: StrategyResultRequest):
         kwargs['date_period'] = request.date_period
     if request.stage is not None:
         kwargs['stage'] = request.stage
-    strategy = StrategyService.get_portfolio_by_id(**kwargs)
+    strategy = await StrategyService.get_portfolio_by_id(**kwargs)
     if strategy is None:
         raise HTTPException(status_code=400, detail="策略选股结果不存在")
-    return strategy
+    return FastJSONResponse(strategy)
 
 @strategy_router.post("/getStrategyFilters", response_model=List[dict])
 async def get_strategy_filters(request: StrategyFilter) -> List[dict]:
     """获取特定策略的筛选条件"""
-    filter_options = StrategyService.get_strategy_options(request.strategy_id)
+    filter_options = await StrategyService.get_strategy_options(request.strategy_id)
     if filter_options is None:
         raise HTTPException(status_code=400, detail="策略筛选条件不存在")
     return filter_options
 
-@strategy_router.post("/getStockPrice", response_model=List[dict])
+@strategy_router.post("/getStockPrice", response_model=List[PriceBarItem], response_class=FastJSONResponse)
 async def get_stock_price(request: StockPrice):
     """获取股票的最新价格"""
-    price = StockPriceService.get_historical_prices(request.stock_code)
+    price = await StockPriceService.get_historical_prices(
+        request.stock_code,
+        start_date=request.start_date,
+        end_date=request.end_date,
+        max_points=request.max_points,
+        level=request.level,
+    )
     if price is None:
         raise HTTPException(status_code=400, detail="股票价格不存在")
-    return price
+    return FastJSONResponse(price)
 
-@strategy_router.get("/strategyAggregation", response_model=List[dict])
+@strategy_router.get("/strategyAggregation", response_model=List[StrategyAggregationItem], response_class=FastJSONResponse)
 async def get_strategy_aggregation():
     """获取策略的聚合结果"""
-    aggregation = StrategyService.strategy_aggregation()
+    aggregation = await StrategyService.strategy_aggregation()
     if aggregation is None:
         raise HTTPException(status_code=400, detail="策略聚合结果不存在")
-    return aggregation
\ No newline at end of file
+    return FastJSONResponse(aggregation)
+
+@strategy_router.get("/cacheStats")
+async def get_cache_stats():
+    """获取策略结果缓存的命中、淘汰统计及最新指标快照状态"""
+    return {**strategy_cache.stats(), "latestSnapshot": latest_snapshot.stats()}
@@ -1,12 +1,22 @@
-import pandas as pd
-import concurrent.futures
-from datetime import datetime, time
+from __future__ import annotations
+
+import asyncio
+from datetime import date
 from typing import List, Optional, Dict
 from strategy_management.models import Strategy
-from databases.databases_connection import Session, engine
-from databases.data_models import StrategyDivquality, BasicInfoStock, StrategyGrowthmomentum, StockIndicators, TechStrongWatchlist, TechStrongSignals, MarketPriceDaily, StockLatestIndicator
-from utilities.basic_funcs import stock_market
+from strategy_management.cache import strategy_cache
+from databases.databases_connection import AsyncSession, async_engine
+from databases.query_stats import query_source
+from databases.ohlcv_store import ohlcv_store
+from databases.latest_snapshot import latest_snapshot
+from databases.data_models import StrategyDivquality, BasicInfoStock, StrategyGrowthmomentum, StockIndicators, TechStrongWatchlist, TechStrongSignals, MarketPriceDaily
+from utilities.result_builder import build_stock_records, build_price_records, loads
+from utilities.basic_funcs import bare_code
+from utilities.downsampling import PriceLevel, resample_ohlcv, downsample_lttb
 from sqlalchemy import func, select, text
+from utilities.lazy_imports import lazy_import
+
+pd = lazy_import("pandas")
 
 # 目前支持的策略汇总
 stratigies = [
@@ -16,6 +26,58 @@ stratigies = [
     Strategy(id=3, name="强势股跟踪", description="前高放量突破+换手率过滤+龙虎榜机构净买入", ),
 ]
 
+def _slice_json(order: str) -> str:
+    """策略切片行 -> 列式JSON（代码、日期、得分各一个数组，按 order 排序），简称等字段由最新指标快照补齐"""
+    columns = ", ".join(f"'{column}', COALESCE(json_agg({column} ORDER BY {order}), '[]')"
+                        for column in ('code', 'trade_date', 'score'))
+    return f"json_build_object({columns})"
+
+
+# 策略聚合：各切片及报告期目录在同一条语句中聚合为JSON
+AGGREGATION_SQL = f"""
+    WITH momentum_dates AS (
+        SELECT DISTINCT end_date FROM quant_research.strategy_growth_momentum
+    ), divquality_dates AS (
+        SELECT DISTINCT end_date FROM quant_research.strategy_divquality
+    ), momentum AS (
+        SELECT code, trading AS trade_date, signal_growth AS score
+        FROM quant_research.strategy_growth_momentum
+        WHERE end_date = (SELECT MAX(end_date) FROM momentum_dates)
+    ), divquality AS (
+        SELECT code, trading AS trade_date, signal AS score
+        FROM quant_research.strategy_divquality
+        WHERE end_date = (SELECT MAX(end_date) FROM divquality_dates)
+    ), watchlist AS (
+        SELECT ticker AS code, trade_date, score
+        FROM quant_research."technicals_strongStocks_watchlist"
+        WHERE trade_date IN (
+            SELECT trade_date
+            FROM quant_research."technicals_strongStocks_watchlist"
+            ORDER BY trade_date DESC LIMIT 3
+        )
+    )
+    SELECT
+        (SELECT COALESCE(json_agg(to_char(end_date, 'YYYY-MM-DD') ORDER BY end_date DESC), '[]') FROM momentum_dates) AS momentum_dates,
+        (SELECT COALESCE(json_agg(to_char(end_date, 'YYYY-MM-DD') ORDER BY end_date DESC), '[]') FROM divquality_dates) AS divquality_dates,
+        (SELECT {_slice_json('score DESC')} FROM momentum) AS momentum_stocks,
+        (SELECT {_slice_json('score DESC')} FROM divquality) AS divquality_stocks,
+        (SELECT {_slice_json('trade_date DESC, score DESC')} FROM watchlist) AS watchlist_stocks
+"""
+
+
+# 各结果依赖的来源表，用于缓存数据版本校验；最新指标快照的版本包含在缓存键中
+PORTFOLIO_SOURCES = {
+    0: ('strategy_growth_momentum',),
+    1: ('strategy_divquality',),
+    (3, 1): ('technicals_strongStocks_watchlist',),
+    (3, 2): ('technicals_strongStocks_signals',),
+}
+OPTION_SOURCES = {
+    0: ('strategy_growth_momentum',),
+    1: ('strategy_divquality',),
+}
+AGGREGATION_SOURCES = ('strategy_growth_momentum', 'strategy_divquality', 'technicals_strongStocks_watchlist')
+
 class StrategyService:
     """策略服务层，处理策略的业务逻辑"""    
     @staticmethod
@@ -24,118 +86,82 @@ class StrategyService:
         return stratigies
     
     @staticmethod
-    def get_portfolio_by_id(strategy_id: int, report_date: str="2025-09-30", date_period: int=3, stage=1) -> Optional[List[Dict]]:
+    async def get_portfolio_by_id(strategy_id: int, report_date: str="2025-09-30", date_period: int=3, stage=1) -> Optional[List[Dict]]:
         """根据策略ID和报告日期、交易日区间获取策略组合的股票列表"""
         assert stage in [1,2]
         assert date_period in [3,5,10,20]
-        with Session() as session:
-            if strategy_id == 1:  # 红利质量策略
-                r = session.query(
+        sources = PORTFOLIO_SOURCES.get((strategy_id, stage) if strategy_id == 3 else strategy_id)
+        if sources is None:
+            return None
+        # 缓存键只包含结果实际依赖的参数：强势股跟踪按信号池和交易日区间，其余策略按报告期；快照更新后旧条目不再命中
+        if strategy_id == 3:
+            key = ('portfolio', strategy_id, stage, date_period, latest_snapshot.version)
+        else:
+            key = ('portfolio', strategy_id, report_date, latest_snapshot.version)
+        return await strategy_cache.get_or_compute(
+            key, sources,
+            lambda: StrategyService._query_portfolio(strategy_id, report_date, date_period, stage)
+        )
+
+    @staticmethod
+    @query_source
+    async def _query_portfolio(strategy_id: int, report_date: str, date_period: int, stage: int) -> Optional[List[Dict]]:
+        """查询策略组合的股票列表"""
+        end_date = date.fromisoformat(report_date)
+        if strategy_id == 1:  # 红利质量策略
+            stmt = (
+                select(
                     StrategyDivquality.trading.label('trade_date'),
                     StrategyDivquality.code,
-                    StockLatestIndicator.short_name,
-                    StockLatestIndicator.industry_name,
                     StrategyDivquality.signal,
-                    StockLatestIndicator.total_mv,
-                    StockLatestIndicator.change_pct.label('change20d')
-                ).join(
-                    StockLatestIndicator,
-                    StrategyDivquality.code == StockLatestIndicator.code
-                ).filter(
-                    StrategyDivquality.end_date == report_date
+                ).where(
+                    StrategyDivquality.end_date == end_date
                 ).order_by(StrategyDivquality.signal.desc())
-                r = pd.DataFrame(r)
-                r['stage'] = ''
-            
-            elif strategy_id == 0:  # 成长动量策略
-                r = session.query(
+            )
+
+        elif strategy_id == 0:  # 成长动量策略
+            stmt = (
+                select(
                     StrategyGrowthmomentum.trading.label('trade_date'),
                     StrategyGrowthmomentum.code,
-                    StockLatestIndicator.short_name,
-                    StockLatestIndicator.industry_name,
                     StrategyGrowthmomentum.signal_growth.label('signal'),
-                    StockLatestIndicator.total_mv,
-                    StockLatestIndicator.change_pct.label('change20d')
-                ).join(
-                    StockLatestIndicator,
-                    StrategyGrowthmomentum.code == StockLatestIndicator.code
-                ).filter(
-                    StrategyGrowthmomentum.end_date == report_date
-                ).order_by(StrategyGrowthmomentum.signal_growth.desc()).all()
-                r = pd.DataFrame(r)
-                r['stage'] = ''
+                ).where(
+                    StrategyGrowthmomentum.end_date == end_date
+                ).order_by(StrategyGrowthmomentum.signal_growth.desc())
+            )
 
-            elif strategy_id == 3:  # 强势股跟踪策略
-                if stage == 1:
-                    watchlist_dates_sq = (
-                        select(TechStrongWatchlist.trade_date)
-                        .distinct()
-                        .order_by(TechStrongWatchlist.trade_date.desc())
-                        .limit(date_period)
-                        .subquery()
-                    )
-                    r1 = (
-                        select(
-                            TechStrongWatchlist.trade_date, 
-                            TechStrongWatchlist.ticker.label('code'), 
-                            TechStrongWatchlist.board,
-                            TechStrongWatchlist.score.label('signal'),
-                            StockLatestIndicator.short_name,
-                            StockLatestIndicator.industry_name,
-                            StockLatestIndicator.total_mv,
-                            StockLatestIndicator.change_pct.label('change20d')
-                            )
-                        .join(watchlist_dates_sq, TechStrongWatchlist.trade_date == watchlist_dates_sq.c.trade_date)
-                        .join(StockLatestIndicator, TechStrongWatchlist.ticker == StockLatestIndicator.code)
-                        .order_by(TechStrongWatchlist.trade_date.desc(), TechStrongWatchlist.score.desc())
-                    )
-                    r = pd.DataFrame(session.execute(r1).all())
-                elif stage == 2:
-                    signals_dates_sq = (
-                        select(TechStrongSignals.trade_date)
-                        .distinct()
-                        .order_by(TechStrongSignals.trade_date.desc())
-                        .limit(date_period)
-                        .subquery()
-                    )
-                    r2 = (
-                        select(
-                            TechStrongSignals.trade_date, 
-                            TechStrongSignals.ticker.label('code'), 
-                            TechStrongSignals.board, 
-                            TechStrongSignals.score.label('signal'),
-                            StockLatestIndicator.short_name,
-                            StockLatestIndicator.industry_name,
-                            StockLatestIndicator.total_mv,
-                            StockLatestIndicator.change_pct.label('change20d')
-                            )
-                        .join(signals_dates_sq, TechStrongSignals.trade_date == signals_dates_sq.c.trade_date)
-                        .join(StockLatestIndicator, TechStrongSignals.ticker == StockLatestIndicator.code)
-                        .order_by(TechStrongSignals.trade_date.desc(), TechStrongSignals.score.desc())
-                    )
-                    r = pd.DataFrame(session.execute(r2).all())
-                else:
-                    raise ValueError("Invalid stage value. Must be 1 or 2.")
+        elif strategy_id == 3:  # 强势股跟踪策略
+            if stage == 1:
+                table = TechStrongWatchlist
+            elif stage == 2:
+                table = TechStrongSignals
             else:
-                return None # type: ignore
-        # 整理查询数据结果
-        r.reset_index(drop=True, inplace=True)
-        r['code'] = r['code'].apply(lambda x: stock_market(x))
-        result = []
-        for i in range(len(r)):
-            original_code = r.iloc[i]['code'].split('.')[-1] if '.' in r.iloc[i]['code'] else r.iloc[i]['code']
-            _r = {
-                'code': r.iloc[i]['code'],
-                'tradeDate': int(datetime.combine(r.iloc[i]['trade_date'], time.min).timestamp() * 1000),
-                'shortName': r.iloc[i]['short_name'],
-                'industryName': r.iloc[i]['industry_name'],
-                'totalMv': r.iloc[i]['total_mv']/100000,
-                'score': r.iloc[i]['signal'],
-                'themes': [],  # 主题数据暂未添加
-                'change20d': r.iloc[i]['change20d'],
-            }
-            result.append(_r)
-        return result # type: ignore
+                raise ValueError("Invalid stage value. Must be 1 or 2.")
+            dates_sq = (
+                select(table.trade_date)
+                .distinct()
+                .order_by(table.trade_date.desc())
+                .limit(date_period)
+                .subquery()
+            )
+            stmt = (
+                select(
+                    table.trade_date,
+                    table.ticker.label('code'),
+                    table.board,
+                    table.score.label('signal'),
+                    )
+                .join(dates_sq, table.trade_date == dates_sq.c.trade_date)
+                .order_by(table.trade_date.desc(), table.score.desc())
+            )
+        else:
+            return None # type: ignore
+
+        async with AsyncSession() as session:
+            r = pd.DataFrame((await session.execute(stmt)).all())
+        # 简称、行业、总市值、涨跌幅由最新指标快照补齐，不在快照中的股票剔除（同原联表口径），再列式整形
+        r = latest_snapshot.enrich(r, how='inner')
+        return build_stock_records(r, date_column='trade_date', score_column='signal', change_column='change_pct')
     
     @staticmethod
     def get_portfolio_performance(strategy_id: int) -> Optional[Dict]:
@@ -145,12 +171,23 @@ class StrategyService:
         return {}
     
     @staticmethod
-    def get_strategy_options(strategy_id: int) -> Optional[List[Dict]]:
+    async def get_strategy_options(strategy_id: int) -> Optional[List[Dict]]:
         """获取策略的可选参数"""
+        if strategy_id not in OPTION_SOURCES:
+            return await StrategyService._query_strategy_options(strategy_id)
+        return await strategy_cache.get_or_compute(
+            ('options', strategy_id), OPTION_SOURCES[strategy_id],
+            lambda: StrategyService._query_strategy_options(strategy_id)
+        )
+
+    @staticmethod
+    @query_source
+    async def _query_strategy_options(strategy_id: int) -> Optional[List[Dict]]:
+        """查询策略的可选参数"""
 
         if strategy_id == 0:  # 成长动量策略
-            with Session() as session:
-                dates = session.query(StrategyGrowthmomentum.end_date).distinct().order_by(StrategyGrowthmomentum.end_date.desc()).all()
+            async with AsyncSession() as session:
+                dates = (await session.execute(select(StrategyGrowthmomentum.end_date).distinct().order_by(StrategyGrowthmomentum.end_date.desc()))).all()
                 date_options = [{"label": date[0].strftime("%Y-%m-%d"), "value": date[0].strftime("%Y-%m-%d")} for date in dates]
 
             filter_options=[
@@ -159,8 +196,8 @@ class StrategyService:
             ]
         elif strategy_id == 1:  # 红利质量策略
             # 获取成长动量的报告期
-            with Session() as session:
-                dates = session.query(StrategyDivquality.end_date).distinct().order_by(StrategyDivquality.end_date.desc()).all()
+            async with AsyncSession() as session:
+                dates = (await session.execute(select(StrategyDivquality.end_date).distinct().order_by(StrategyDivquality.end_date.desc()))).all()
                 date_options = [{"label": date[0].strftime("%Y-%m-%d"), "value": date[0].strftime("%Y-%m-%d")} for date in dates]
 
             filter_options=[
@@ -183,116 +220,30 @@ class StrategyService:
         return filter_options
     
     @staticmethod
-    def strategy_aggregation():
+    def _slice_records(columns) -> List[Dict]:
+        """聚合切片（列式JSON）补齐最新指标快照字段后整形，不在快照中的股票保留、字段为空（同原左联表口径）"""
+        r = latest_snapshot.enrich(loads(columns), how='left')
+        return build_stock_records(r, date_column='trade_date', score_column='score', change_column='change_pct')
+
+    @staticmethod
+    async def strategy_aggregation():
         """策略聚合接口"""
-        
-        with Session() as session:
-            dates_momentum = session.query(StrategyGrowthmomentum.end_date).distinct().order_by(StrategyGrowthmomentum.end_date.desc()).all()
-            dates_divquality = session.query(StrategyDivquality.end_date).distinct().order_by(StrategyDivquality.end_date.desc()).all()
-        
-        date_momentum_options = [{"label": date[0].strftime("%Y-%m-%d"), "value": date[0].strftime("%Y-%m-%d")} for date in dates_momentum]
-        date_divquality_options = [{"label": date[0].strftime("%Y-%m-%d"), "value": date[0].strftime("%Y-%m-%d")} for date in dates_divquality]
+        return await strategy_cache.get_or_compute(
+            ('aggregation', latest_snapshot.version), AGGREGATION_SOURCES, StrategyService._query_strategy_aggregation
+        )
 
-        # 定义查询函数
-        def query_growth_momentum():
-            sql = """
-                SELECT a.code, b.short_name, a.end_date, a.trading, b.industry_name, a.signal_growth as score, b.total_mv, b.change_pct
-                FROM quant_research.strategy_growth_momentum as a
-                left join quant_research.platform_stock_daily as b on a.code = b.code
-                WHERE a.end_date = (
-                    SELECT MAX(end_date)
-                    FROM quant_research.strategy_growth_momentum
-                )
-                ORDER BY a.signal_growth desc;
-            """
-            return pd.read_sql(sql, engine)
-            
-        def query_divquality():
-            sql = """
-                SELECT a.code, b.short_name, a.end_date, a.trading, b.industry_name, a.signal as score, b.total_mv, b.change_pct
-                FROM quant_research.strategy_divquality as a
-                left join quant_research.platform_stock_daily as b on a.code = b.code
-                WHERE a.end_date = (
-                    SELECT MAX(end_date)
-                    FROM quant_research.strategy_divquality
-                )
-                ORDER BY a.signal desc;
-            """
-            return pd.read_sql(sql, engine)
-        
-        def query_strong_watchlist():
-            sql = """
-                SELECT a.ticker as code, b.short_name, a.trade_date, b.industry_name, a.score, b.total_mv, b.change_pct
-                FROM quant_research."technicals_strongStocks_watchlist" as a
-                left join quant_research.platform_stock_daily as b on a.ticker = b.code
-                WHERE a.trade_date in (
-                    SELECT trade_date
-                    FROM quant_research."technicals_strongStocks_watchlist"
-                    order BY trade_date DESC LIMIT 3
-                    )
-                ORDER BY a.trade_date desc, a.score desc;
-            """            
-            return pd.read_sql(sql, engine)
-        
-        # 并行执行查询
-        results = {}
-        with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-            future_to_query = {
-                executor.submit(query_growth_momentum): "growth_momentum",
-                executor.submit(query_divquality): "divquality",
-                executor.submit(query_strong_watchlist): "strong_watchlist",
-            }
-            
-            for future in concurrent.futures.as_completed(future_to_query):
-                query_name = future_to_query[future]
-                try:
-                    results[query_name] = future.result()
-                except Exception as exc:
-                    print(f'{query_name} generated an exception: {exc}')
-                    results[query_name] = pd.DataFrame()
+    @staticmethod
+    @query_source
+    async def _query_strategy_aggregation():
+        """查询策略聚合结果：三个策略切片及报告期目录由单条语句返回，一次连接、一次往返"""
+        async with async_engine.connect() as conn:
+            row = (await conn.execute(text(AGGREGATION_SQL))).one()
 
-        # 处理结果
-        growth_momentum_stocks = []
-        if 'growth_momentum' in results and not results['growth_momentum'].empty:
-            for _, row in results['growth_momentum'].iterrows():
-                growth_momentum_stocks.append({
-                    'code': stock_market(row['code']),
-                    'shortName': row['short_name'],
-                    'industryName': row['industry_name'],
-                    'score': float(row['score']) if row['score'] is not None else None,
-                    'totalMv': float(row['total_mv'])/100000 if row['total_mv'] is not None else None,
-                    'tradeDate': int(datetime.combine(row['trading'], time.min).timestamp()*1000),
-                    'themes': [],
-                    'change20d': float(row['change_pct']) if row['change_pct'] is not None else None
-                })
-                
-        divquality_stocks = []
-        if 'divquality' in results and not results['divquality'].empty:
-            for _, row in results['divquality'].iterrows():
-                divquality_stocks.append({
-                    'code': stock_market(row['code']),
-                    'shortName': row['short_name'],
-                    'industryName': row['industry_name'],
-                    'score': float(row['score']) if row['score'] is not None else None,
-                    'totalMv': float(row['total_mv'])/100000 if row['total_mv'] is not None else None,
-                    'tradeDate': int(datetime.combine(row['trading'], time.min).timestamp()*1000),
-                    'themes': [],
-                    'change20d': float(row['change_pct']) if row['change_pct'] is not None else None
-                })
-        
-        strong_watchlist_stocks = []
-        if 'strong_watchlist' in results and not results['strong_watchlist'].empty:
-            for _, row in results['strong_watchlist'].iterrows():
-                strong_watchlist_stocks.append({
-                    'code': stock_market(row['code']),
-                    'shortName': row['short_name'],
-                    'industryName': row['industry_name'],
-                    'score': float(row['score']) if row['score'] is not None else None,
-                    'totalMv': float(row['total_mv'])/100000 if row['total_mv'] is not None else None,
-                    'tradeDate': int(datetime.combine(row['trade_date'], time.min).timestamp()*1000),
-                    'themes': [],
-                    'change20d': float(row['change_pct']) if row['change_pct'] is not None else None
-                })
+        date_momentum_options = [{"label": d, "value": d} for d in loads(row.momentum_dates)]
+        date_divquality_options = [{"label": d, "value": d} for d in loads(row.divquality_dates)]
+        growth_momentum_stocks = StrategyService._slice_records(row.momentum_stocks)
+        divquality_stocks = StrategyService._slice_records(row.divquality_stocks)
+        strong_watchlist_stocks = StrategyService._slice_records(row.watchlist_stocks)
 
         return [
             {
@@ -334,42 +285,69 @@ class StrategyService:
         ]
 
 
+# K线接口输出字段
+PRICE_COLUMNS = ('trade_date', 'open', 'close', 'high', 'low', 'vol')
+
+
 class StockPriceService:
     """股票价格服务层，处理股票业务逻辑"""
     @staticmethod
-    def get_historical_prices(stock_code: str) -> Optional[List[Dict]]:
-        """获取股票的历史价格数据"""
-        if len(stock_code) > 6:
-            stock_code = stock_code.split('.')[0]
-        with Session() as session:
-            r = session.query(
-                MarketPriceDaily.trade_date,
-                MarketPriceDaily.open,
-                MarketPriceDaily.close,
-                MarketPriceDaily.high,
-                MarketPriceDaily.low,
-                MarketPriceDaily.vol
-            ).filter(
-                MarketPriceDaily.ticker == stock_code,
-            ).order_by(MarketPriceDaily.trade_date.asc())
-            r = pd.DataFrame(r)
-            r['trade_date'] = pd.to_datetime(r['trade_date'])
+    async def get_historical_prices(stock_code: str, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                              max_points: Optional[int] = None, level: PriceLevel = 'daily') -> Optional[List[Dict]]:
+        """
+        获取股票的历史价格数据
+        :param start_date: 开始日期（含），本地行情存储按二分定位，查询数据库时下推至SQL
+        :param end_date: 结束日期（含）
+        :param max_points: 最大K线数量，超出时按LTTB降采样
+        :param level: 聚合级别 daily/weekly/monthly
+        """
+        stock_code = bare_code(stock_code)
+        if ohlcv_store.ready:
+            # 本地行情存储就绪时直接读取内存映射切片，不访问数据库；切片与整形在工作线程执行，不占用事件循环
+            return await asyncio.to_thread(StockPriceService._store_prices, stock_code, start_date, end_date,
+                                           max_points, level)
+        r = await StockPriceService._query_historical_prices(stock_code, start_date, end_date)
+        return await asyncio.to_thread(StockPriceService._price_records, r, max_points, level)
+
+    @staticmethod
+    def _store_prices(stock_code: str, start_date: Optional[str], end_date: Optional[str],
+                      max_points: Optional[int], level: PriceLevel) -> Optional[List[Dict]]:
+        bars = ohlcv_store.window(stock_code, start_date, end_date)
+        r = pd.DataFrame({field: bars[field] for field in PRICE_COLUMNS} if bars is not None else {})
+        return StockPriceService._price_records(r, max_points, level)
+
+    @staticmethod
+    def _price_records(r: pd.DataFrame, max_points: Optional[int], level: PriceLevel) -> Optional[List[Dict]]:
+        """日K整形：去重、剔除空值、按级别聚合、降采样后输出为K线记录"""
         if r.empty:
             return None
-        else:
-            # 按trade_date去重
-            r = r.drop_duplicates(subset=['trade_date'], keep='last')
-            # 剔除null数据
-            r.dropna(inplace=True)
-            result = []
-            for i in range(len(r)):
-                _r = {
-                    'tradeDate': r.iloc[i]['trade_date'].timestamp() * 1000,
-                    'open': r.iloc[i]['open'],
-                    'close': r.iloc[i]['close'],
-                    'high': r.iloc[i]['high'],
-                    'low': r.iloc[i]['low'],
-                    'volume': r.iloc[i]['vol'],
-                }
-                result.append(_r)
-        return result
\ No newline at end of file
+        r['trade_date'] = pd.to_datetime(r['trade_date'])
+        # 按trade_date去重
+        r = r.drop_duplicates(subset=['trade_date'], keep='last')
+        # 剔除null数据
+        r.dropna(inplace=True)
+        r = resample_ohlcv(r, level)
+        if max_points is not None:
+            r = downsample_lttb(r, max_points)
+        return build_price_records(r)
+
+    @staticmethod
+    @query_source
+    async def _query_historical_prices(stock_code: str, start_date: Optional[str], end_date: Optional[str]) -> pd.DataFrame:
+        """从数据库读取日K数据（本地行情存储未就绪时使用）"""
+        stmt = select(
+            MarketPriceDaily.trade_date,
+            MarketPriceDaily.open,
+            MarketPriceDaily.close,
+            MarketPriceDaily.high,
+            MarketPriceDaily.low,
+            MarketPriceDaily.vol
+        ).where(
+            MarketPriceDaily.ticker == stock_code,
+        )
+        if start_date is not None:
+            stmt = stmt.where(MarketPriceDaily.trade_date >= date.fromisoformat(start_date))
+        if end_date is not None:
+            stmt = stmt.where(MarketPriceDaily.trade_date <= date.fromisoformat(end_date))
+        async with AsyncSession() as session:
+            return pd.DataFrame((await session.execute(stmt.order_by(MarketPriceDaily.trade_date.asc()))).all())
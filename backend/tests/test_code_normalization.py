@@ -0,0 +1,50 @@
+"""
+    代码规范化与最新指标快照补齐：空输入、代码全部不在快照中的情况
+    运行（在 backend 目录下）：python -m pytest -q tests
+"""
+import numpy as np
+
+from databases.latest_snapshot import LatestSnapshot, SNAPSHOT_FIELDS, _Columns
+from utilities.basic_funcs import bare_codes, code_positions, suffix_codes
+
+
+def make_snapshot() -> LatestSnapshot:
+    snapshot = LatestSnapshot()
+    codes = np.array(["000001", "600519"])
+    fields = {field: np.append(np.array(["平安银行", "贵州茅台"] if missing is None else [1.0, 2.0],
+                                        dtype=object if missing is None else float), missing)
+              for field, missing in SNAPSHOT_FIELDS.items()}
+    snapshot._columns = _Columns(("2025-10-17", 1), codes, fields)
+    return snapshot
+
+
+def test_empty_codes():
+    assert bare_codes([]).size == 0
+    assert suffix_codes([]).size == 0
+    assert code_positions(np.array(["000001"]), []).size == 0
+    assert code_positions(np.array([], dtype=str), ["000001"]).tolist() == [-1]
+
+
+def test_conversion_round_trip():
+    assert suffix_codes(["600519", "000001", "300750", "830799", "600519.SH", "123"]).tolist() == \
+        ["600519.SH", "000001.SZ", "300750.SZ", "830799.BJ", "600519.SH", "123"]
+    assert bare_codes(["600519.SH", "000001"]).tolist() == ["600519", "000001"]
+
+
+def test_enrich_empty_slice():
+    # 聚合切片无数据时为 {"code": [], ...}
+    columns = make_snapshot().enrich({"code": [], "trade_date": [], "score": []}, how="left")
+    assert len(columns["code"]) == 0
+    assert all(len(columns[field]) == 0 for field in SNAPSHOT_FIELDS)
+
+
+def test_enrich_inner_all_missing():
+    columns = make_snapshot().enrich({"code": ["300750", "830799.BJ"], "signal": [1.0, 2.0]}, how="inner")
+    assert len(columns["code"]) == 0 and len(columns["signal"]) == 0
+    assert all(len(columns[field]) == 0 for field in SNAPSHOT_FIELDS)
+
+
+def test_enrich_left_keeps_missing():
+    columns = make_snapshot().enrich({"code": ["600519.SH", "300750"]}, how="left")
+    assert columns["short_name"].tolist() == ["贵州茅台", None]
+    assert columns["total_mv"][0] == 2.0 and np.isnan(columns["total_mv"][1])
@@ -1,11 +1,56 @@
-def stock_market(code: str):
-    if code[0] == "6":
-        return code + ".SH"
-    elif code[0] == "0":
-        return code + ".SZ"
-    elif code[0] == "3":
-        return code + ".SZ"
-    elif code[0] == "8":
-        return code + ".BJ"
-    else:
-        return code
\ No newline at end of file
+"""
+    股票代码规范化：6位代码 <-> 带交易所后缀代码，规则统一由 MARKET_SUFFIX 定义
+    批量转换为单次向量化调用（numpy.strings），不逐个调用Python函数
+"""
+from __future__ import annotations
+
+from utilities.lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+
+# 代码首位 -> 交易所后缀
+MARKET_SUFFIX = {"6": ".SH", "0": ".SZ", "3": ".SZ", "8": ".BJ"}
+
+_PREFIXES = sorted(MARKET_SUFFIX)
+_SUFFIXES = [MARKET_SUFFIX[prefix] for prefix in _PREFIXES] + [""]  # 末尾为无法识别时的空后缀
+
+
+def bare_code(code: str) -> str:
+    """6位代码：去掉交易所后缀"""
+    return code.partition(".")[0]
+
+
+def stock_market(code: str) -> str:
+    """添加交易所后缀，已带后缀或无法识别的代码原样返回"""
+    if "." in code:
+        return code
+    return code + MARKET_SUFFIX.get(code[:1], "")
+
+
+def bare_codes(codes) -> np.ndarray:
+    """批量去掉交易所后缀"""
+    codes = np.asarray(codes, dtype=str)
+    if not codes.size:  # numpy.strings.partition 不支持空数组
+        return codes
+    return np.strings.partition(codes, ".")[0]
+
+
+def suffix_codes(codes) -> np.ndarray:
+    """批量添加交易所后缀，已带后缀或无法识别的代码原样返回（规则同 stock_market）"""
+    codes = np.asarray(codes, dtype=str)
+    if not codes.size:
+        return codes
+    prefixes = np.array(_PREFIXES)
+    first = codes.astype("U1")
+    pos = np.searchsorted(prefixes, first).clip(max=len(prefixes) - 1)
+    known = (prefixes[pos] == first) & (np.strings.find(codes, ".") < 0)
+    return np.strings.add(codes, np.array(_SUFFIXES)[np.where(known, pos, len(prefixes))])
+
+
+def code_positions(sorted_codes: np.ndarray, codes) -> np.ndarray:
+    """批量定位代码在升序代码数组中的下标（二分查找），不存在的代码为 -1"""
+    codes = np.asarray(codes, dtype=str)
+    if not len(sorted_codes) or not codes.size:
+        return np.full(len(codes), -1, dtype=np.int64)
+    pos = np.searchsorted(sorted_codes, codes).clip(max=len(sorted_codes) - 1)
+    return np.where(sorted_codes[pos] == codes, pos, -1)
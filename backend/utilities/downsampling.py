@@ -0,0 +1,95 @@
+"""
+    行情序列降采样：OHLCV周期重采样（日/周/月）与 LTTB 视觉降采样
+"""
+from __future__ import annotations
+
+from typing import Literal
+
+from utilities.lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+PriceLevel = Literal["daily", "weekly", "monthly"]
+
+# 聚合级别 -> pandas周期
+_LEVEL_PERIODS = {"weekly": "W", "monthly": "M"}
+
+# OHLCV聚合口径：日期取周期内最后一个交易日
+_OHLCV_AGG = {
+    "trade_date": "last",
+    "open": "first",
+    "high": "max",
+    "low": "min",
+    "close": "last",
+    "vol": "sum",
+}
+
+
+def resample_ohlcv(frame: pd.DataFrame, level: PriceLevel = "daily") -> pd.DataFrame:
+    """
+    按周/月聚合日K数据
+    :param frame: 按trade_date升序的日K数据，包含 trade_date, open, high, low, close, vol
+    :param level: daily 原样返回；weekly/monthly 按自然周/自然月聚合
+    """
+    if level == "daily" or frame.empty:
+        return frame
+    if level not in _LEVEL_PERIODS:
+        raise ValueError(f"Invalid level: {level}")
+    periods = frame["trade_date"].dt.to_period(_LEVEL_PERIODS[level])
+    return frame.groupby(periods, sort=True).agg(_OHLCV_AGG).reset_index(drop=True)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets 降采样，返回保留点的下标（始终保留首尾点）
+    :param x: 横坐标（单调递增）
+    :param y: 纵坐标
+    :param threshold: 目标点数
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # 首尾点之外的区间均分为 threshold-2 个桶
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # 下一个桶的均值点作为三角形第三个顶点
+        next_start = end
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        bucket_x = x[start:end]
+        bucket_y = y[start:end]
+        areas = np.abs((x[a] - avg_x) * (bucket_y - y[a]) - (x[a] - bucket_x) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+
+def downsample_lttb(frame: pd.DataFrame, max_points: int, value_column: str = "close") -> pd.DataFrame:
+    """
+    按收盘价曲线形态选取不超过 max_points 根K线
+    被丢弃的K线并入其前一根保留K线：最高/最低价取区间极值、成交量求和，保证降采样后K线振幅不被低估
+    """
+    if max_points is None or len(frame) <= max_points:
+        return frame
+    x = np.arange(len(frame), dtype=float)  # 按交易日序号等距，避免停牌缺口影响桶划分
+    idx = lttb_indices(x, frame[value_column].to_numpy(dtype=float), max_points)
+    out = frame.iloc[idx].copy()
+    if "high" in frame:
+        out["high"] = np.fmax.reduceat(frame["high"].to_numpy(dtype=float), idx)
+    if "low" in frame:
+        out["low"] = np.fmin.reduceat(frame["low"].to_numpy(dtype=float), idx)
+    if "vol" in frame:
+        out["vol"] = np.add.reduceat(np.nan_to_num(frame["vol"].to_numpy(dtype=float)), idx)
+    return out
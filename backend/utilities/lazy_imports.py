@@ -0,0 +1,36 @@
+"""
+    延迟导入：返回的模块代理在首次访问属性时才真正执行导入，缩短应用冷启动（uvicorn worker 启动、reload）耗时
+    用于导入代价高、只在请求处理路径上使用的库（pandas、numpy）；使用方模块的类型注解需配合 from __future__ import annotations，
+    否则函数定义时求值注解即触发导入
+    不使用 importlib.util.LazyLoader：Python 3.12 早期版本中多个线程（asyncio.to_thread）同时首次访问会拿到未初始化完的模块
+"""
+import importlib
+import importlib.util
+import sys
+import threading
+import types
+
+
+class _LazyModule(types.ModuleType):
+    """模块代理：首次访问属性时经 import 系统（自带模块锁，线程安全）导入，之后属性直接从代理自身字典读取"""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_lazy_lock"] = threading.Lock()
+
+    def __getattr__(self, attr: str):
+        # 仅在代理自身字典中找不到属性时调用
+        with self.__dict__["_lazy_lock"]:
+            module = importlib.import_module(self.__name__)
+            self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """延迟导入模块，已导入时直接返回"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    if importlib.util.find_spec(name) is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    return _LazyModule(name)
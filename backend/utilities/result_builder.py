@@ -0,0 +1,125 @@
+"""
+    查询结果整形层：将查询结果一次性列式转换为前端所需的camelCase结构，并通过快速JSON编码输出
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List
+
+from dateutil.tz import tzlocal
+from fastapi.responses import JSONResponse
+
+from utilities.basic_funcs import suffix_codes
+from utilities.lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+try:
+    import orjson
+except ImportError:  # orjson为可选依赖，缺失时回退标准库json
+    orjson = None
+
+# 市值单位换算（元 -> 十万元），与原逐行计算口径一致
+TOTAL_MV_SCALE = 100000
+
+
+def dates_to_epoch_ms(dates, local: bool = True) -> np.ndarray:
+    """
+    批量将日期转换为毫秒时间戳
+    :param local: True时按本地时区零点计算（同 datetime.combine(d, time.min).timestamp()），False时按UTC零点计算
+    """
+    idx = pd.DatetimeIndex(pd.to_datetime(dates))
+    if local:
+        idx = idx.tz_localize(tzlocal(), ambiguous="NaT", nonexistent="shift_forward")
+    return idx.as_unit("ms").asi8
+
+
+def _to_float(values) -> np.ndarray:
+    """数值列统一转换为float数组，None转为NaN"""
+    values = np.asarray(values)
+    if values.dtype.kind == "f":
+        return values.astype(float, copy=False)
+    return pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=float)
+
+
+def columns_to_records(columns: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """列数组（列名 -> 数组）输出为记录列表，NaN统一转为None以保证JSON合法"""
+    values = []
+    for column in columns.values():
+        if not isinstance(column, np.ndarray):
+            values.append(column)
+            continue
+        missing = np.isnan(column) if column.dtype.kind == "f" else pd.isna(column) if column.dtype == object else None
+        column = column.astype(object)
+        if missing is not None and missing.any():
+            column[missing] = None
+        values.append(column)
+    keys = list(columns)
+    return [dict(zip(keys, row)) for row in zip(*values)]
+
+
+def build_stock_records(frame, date_column: str = "trade_date", score_column: str = "signal",
+                        change_column: str = "change20d") -> List[Dict[str, Any]]:
+    """
+    策略选股结果整形
+    :param frame: DataFrame 或 列名 -> 数组，包含 code, short_name, industry_name, total_mv 及日期、得分、涨跌幅列
+    :return: [{"code", "tradeDate", "shortName", "industryName", "totalMv", "score", "themes", "change20d"}]
+    """
+    if frame is None or "code" not in frame or len(frame["code"]) == 0:
+        return []
+    n = len(frame["code"])
+    return columns_to_records({
+        "code": suffix_codes(frame["code"]),
+        "tradeDate": dates_to_epoch_ms(frame[date_column]),
+        "shortName": np.asarray(frame["short_name"], dtype=object),
+        "industryName": np.asarray(frame["industry_name"], dtype=object),
+        "totalMv": _to_float(frame["total_mv"]) / TOTAL_MV_SCALE,
+        "score": _to_float(frame[score_column]),
+        "themes": [[] for _ in range(n)],  # 主题数据暂未添加
+        "change20d": _to_float(frame[change_column]),
+    })
+
+
+def build_price_records(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    K线数据整形
+    :param frame: 包含 trade_date, open, close, high, low, vol 的行情数据
+    :return: [{"tradeDate", "open", "close", "high", "low", "volume"}]
+    """
+    if frame is None or frame.empty:
+        return []
+    return columns_to_records({
+        "tradeDate": dates_to_epoch_ms(frame["trade_date"], local=False),
+        "open": _to_float(frame["open"]),
+        "close": _to_float(frame["close"]),
+        "high": _to_float(frame["high"]),
+        "low": _to_float(frame["low"]),
+        "volume": _to_float(frame["vol"]),
+    })
+
+
+def loads(content) -> Any:
+    """快速JSON解码，优先使用orjson；驱动已解码的值原样返回"""
+    if not isinstance(content, (str, bytes, bytearray, memoryview)):
+        return content
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def dumps(content: Any) -> bytes:
+    """快速JSON编码，优先使用orjson"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    快速JSON响应：直接返回该响应时FastAPI不再按response_model二次校验，
+    response_model仅用于生成接口文档
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)